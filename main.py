@@ -1,14 +1,61 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import requests
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import random
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import csv
+import hashlib
+import heapq
+import hmac
+import io
+import itertools
+import mmap
+import struct
+import sys
+import threading
+import time
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+from zoneinfo import ZoneInfo
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library decoder
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet/Arrow export is optional
+    pyarrow = None
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app):
+    """Load the warm-restart snapshot and start scheduled jobs; save the snapshot on shutdown"""
+    load_snapshot()
+    threading.Thread(target=load_pending_sections, daemon=True).start()
+    start_scheduler()
+    try:
+        yield
+    finally:
+        await stop_scheduler()
+        flush_all_updates()
+        save_snapshot()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Airtable Server API",
     description="Complete CRUD API for Airtable integration",
     version="1.0.0",
@@ -22,12 +69,1117 @@ app = FastAPI(
 # Airtable configuration
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 BASE_ID = os.getenv("BASE_ID")
-BASE_URL = f"https://api.airtable.com/v0/{BASE_ID}"
 
-headers = {
-    "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-    "Content-Type": "application/json"
+# Request tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_SLOWEST_SIZE = int(os.getenv("TRACE_SLOWEST_SIZE", "20"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+current_span = contextvars.ContextVar("current_span", default=None)
+recent_traces = collections.deque(maxlen=TRACE_BUFFER_SIZE)
+slowest_traces = []  # min-heap of (duration_ns, trace_id, root span)
+traces_lock = threading.Lock()
+
+class Span:
+    """A timed operation inside a traced request; spans nest into a tree"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "children")
+
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.children = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def duration_ms(self):
+        return round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3)
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "duration_ms": self.duration_ms(),
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+class NoopSpan:
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Record a child span of the current request's trace; does nothing when not sampled"""
+    parent = current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    parent.children.append(child)
+    token = current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        current_span.reset(token)
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def export_trace_otlp(root):
+    """Append a finished trace to TRACE_EXPORT_PATH as one OTLP/JSON line"""
+    kinds = {"internal": 1, "server": 2, "client": 3}
+    spans = []
+    for item in root.walk():
+        otlp_span = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": kinds[item.kind],
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns or item.start_ns),
+            "attributes": [{"key": k, "value": otlp_value(v)} for k, v in item.attributes.items()],
+            "status": {"code": 2 if "error" in item.attributes else 0}
+        }
+        if item.parent_id:
+            otlp_span["parentSpanId"] = item.parent_id
+        spans.append(otlp_span)
+    line = json.dumps({"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "airtable-server"}}]},
+        "scopeSpans": [{"scope": {"name": "airtable-server"}, "spans": spans}]
+    }]})
+    try:
+        with traces_lock, open(TRACE_EXPORT_PATH, "a") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        print(f"❌ Trace export error: {str(e)}")
+
+def record_trace(root):
+    duration = root.end_ns - root.start_ns
+    with traces_lock:
+        recent_traces.append(root)
+        if len(slowest_traces) < TRACE_SLOWEST_SIZE:
+            heapq.heappush(slowest_traces, (duration, root.trace_id, root))
+        elif duration > slowest_traces[0][0]:
+            heapq.heapreplace(slowest_traces, (duration, root.trace_id, root))
+    if TRACE_EXPORT_PATH:
+        export_trace_otlp(root)
+
+class TracingMiddleware:
+    """ASGI middleware that traces a sample of requests, or any request sent with X-Trace: 1"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (random.random() < TRACE_SAMPLE_RATE or (b"x-trace", b"1") in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(f"{scope['method']} {scope['path']}", os.urandom(16).hex(), kind="server",
+                    attributes={"http.method": scope["method"], "http.target": scope["path"]})
+        token = current_span.set(root)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", root.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            root.end_ns = time.time_ns()
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            record_trace(root)
+
+app.add_middleware(TracingMiddleware)
+
+def trace_summary(root):
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "status": root.attributes.get("http.status_code"),
+        "started_at": datetime.fromtimestamp(root.start_ns / 1e9).isoformat(),
+        "duration_ms": root.duration_ms(),
+        "spans": sum(1 for _ in root.walk())
+    }
+
+@app.get("/debug/traces")
+def debug_traces(request: Request, trace_id: str = None, limit: int = 20):
+    """Recent and slowest request traces, or the full span tree of one trace"""
+    require_admin(request)
+    with traces_lock:
+        recent = list(recent_traces)
+        slowest = [item[2] for item in sorted(slowest_traces, reverse=True)]
+    if trace_id:
+        for root in recent + slowest:
+            if root.trace_id == trace_id:
+                return root.to_dict() | {"trace_id": root.trace_id}
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return {
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "recent": [trace_summary(root) for root in reversed(recent[-limit:])],
+        "slowest": [trace_summary(root) for root in slowest[:limit]]
+    }
+
+# Sampling profiler
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.01"))
+# Where threads wait for work: thread pool workers, queue gets, event waits and the event loop's select()
+PROFILE_IDLE_FRAMES = {("thread.py", "_worker"), ("queue.py", "Queue.get"), ("threading.py", "Event.wait"),
+                       ("selectors.py", "select")}
+
+# Only one sampler runs at a time, whether on-demand or per-request
+profile_lock = threading.Lock()
+request_profiles = collections.OrderedDict()  # profile id -> collapsed stacks, most recent last
+
+class StackSampler:
+    """Samples the Python stacks of every busy thread from a background thread.
+
+    A sample only collects code objects; frame labels are built once per code object when the profile is read.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.counts = collections.Counter()  # (thread id, code objects from the innermost frame out) -> samples
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread_names = {}
+        self.idle_codes = {}
+
+    def is_idle_code(self, code):
+        if code not in self.idle_codes:
+            filename = os.path.basename(code.co_filename)
+            self.idle_codes[code] = ((filename, code.co_name) in PROFILE_IDLE_FRAMES or
+                                     (filename, getattr(code, "co_qualname", "")) in PROFILE_IDLE_FRAMES)
+        return self.idle_codes[code]
+
+    def is_idle(self, frame):
+        # Blocked in C the idle frame is on top; waiting on a Condition it is the caller of threading's wait()
+        return self.is_idle_code(frame.f_code) or (frame.f_back is not None and self.is_idle_code(frame.f_back.f_code))
+
+    def run(self):
+        own_id = threading.get_ident()
+        # Ticks are scheduled from the start, so time spent waiting for the GIL doesn't stretch the interval
+        next_tick = time.monotonic() + self.interval
+        while not self.stop_event.wait(max(0, next_tick - time.monotonic())):
+            next_tick = max(next_tick + self.interval, time.monotonic())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or self.is_idle(frame):
+                    continue
+                if thread_id not in self.thread_names:
+                    self.thread_names.update((t.ident, t.name) for t in threading.enumerate())
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.counts[(thread_id, tuple(codes))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def collapsed(self):
+        """Stacks in flamegraph.pl / speedscope collapsed format: frame;frame;frame count"""
+        labels = {}
+        lines = []
+        for (thread_id, codes), count in self.counts.most_common():
+            for code in codes:
+                if code not in labels:
+                    labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            stack = [self.thread_names.get(thread_id, f"thread-{thread_id}")] + [labels[code] for code in reversed(codes)]
+            lines.append(f"{';'.join(stack)} {count}\n")
+        return "".join(lines)
+
+def is_admin_scope(scope):
+    token = dict(scope["headers"]).get(b"x-admin-token")
+    return bool(ADMIN_TOKEN) and token == ADMIN_TOKEN.encode()
+
+class ProfilingMiddleware:
+    """Profiles a single request sent with X-Profile: 1 and a valid X-Admin-Token"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (b"x-profile", b"1") not in scope["headers"] or not is_admin_scope(scope):
+            await self.app(scope, receive, send)
+            return
+        if not profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = os.urandom(8).hex()
+        sampler = StackSampler()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            profile_lock.release()
+            request_profiles[profile_id] = sampler.collapsed()
+            while len(request_profiles) > 20:
+                request_profiles.popitem(last=False)
+
+app.add_middleware(ProfilingMiddleware)
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(request: Request, seconds: float = 10):
+    """Sample every thread (event loop, workers, scheduler jobs) for N seconds; returns collapsed stacks"""
+    require_admin(request)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS}")
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        sampler = StackSampler()
+        sampler.start()
+        print(f"🔬 Profiling for {seconds}s...")
+        await asyncio.sleep(seconds)
+        await asyncio.to_thread(sampler.stop)
+    finally:
+        profile_lock.release()
+    print(f"🔬 Profile done: {sampler.samples} samples")
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+@app.get("/debug/profile/{profile_id}", response_class=PlainTextResponse)
+def debug_request_profile(profile_id: str, request: Request):
+    """Collapsed stacks captured for a request sent with X-Profile: 1"""
+    require_admin(request)
+    if profile_id not in request_profiles:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return PlainTextResponse(request_profiles[profile_id])
+
+# Upstream resilience configuration
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+UPSTREAM_INITIAL_CONCURRENCY = float(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "4"))
+UPSTREAM_MIN_CONCURRENCY = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32"))
+UPSTREAM_LATENCY_TOLERANCE = float(os.getenv("UPSTREAM_LATENCY_TOLERANCE", "2"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30"))
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))  # requests per second per base
+
+class UpstreamUnavailableError(Exception):
+    """Airtable could not be reached for a table, or its circuit is open"""
+
+    def __init__(self, table, reason, retry_after=None):
+        super().__init__(f"Airtable unavailable for {table}: {reason}")
+        self.table = table
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Per-table breaker: closed -> open after repeated failures -> half-open single probe"""
+
+    def __init__(self, table):
+        self.table = table
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def retry_after(self):
+        return max(0.0, self.opened_at + BREAKER_RESET_SECONDS - time.time())
+
+    def is_open(self):
+        return self.state == "open" and self.retry_after() > 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.retry_after() > 0:
+                return False
+            # Reset period elapsed: let exactly one probe through
+            if self.probe_in_flight:
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                print(f"🟢 Circuit closed for {self.table}")
+            self.state = "closed"
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == "half_open" or self.failures >= BREAKER_FAILURE_THRESHOLD:
+                if self.state != "open":
+                    print(f"🔴 Circuit opened for {self.table} after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def status(self):
+        state = self.state
+        if state == "open" and not self.is_open():
+            state = "half_open"
+        return {
+            "state": state,
+            "failures": self.failures,
+            "retry_after": round(self.retry_after(), 1) if self.state == "open" else 0
+        }
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+def get_breaker(table):
+    with breakers_lock:
+        if table not in breakers:
+            breakers[table] = CircuitBreaker(table)
+        return breakers[table]
+
+class ConcurrencyLimiter:
+    """Adaptive in-flight limit for Airtable calls.
+
+    Additive increase (+1 per limit's worth of calls) while latency stays within
+    UPSTREAM_LATENCY_TOLERANCE of its baseline and the limit is in use; multiplicative
+    decrease by the latency gradient when calls slow down, and by half on 429/5xx/timeouts.
+    """
+
+    def __init__(self):
+        self.limit = max(float(UPSTREAM_MIN_CONCURRENCY), min(UPSTREAM_INITIAL_CONCURRENCY, UPSTREAM_MAX_CONCURRENCY))
+        self.in_flight = 0
+        self.waiting = 0
+        self.baselines = {}  # method -> lowest recent latency
+        self.latency_ratio = 1.0  # smoothed latency / baseline
+        self.latency = 0.0
+        self.queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.last_decrease = 0.0
+        self.counts = collections.Counter()
+        self.cond = threading.Condition()
+
+    def acquire(self, table):
+        """Wait for a free slot; returns the time spent queued"""
+        start = time.monotonic()
+        with self.cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = start + UPSTREAM_QUEUE_TIMEOUT - time.monotonic()
+                    if remaining <= 0:
+                        self.counts["queue_timeouts"] += 1
+                        raise UpstreamUnavailableError(table, "concurrency queue timeout")
+                    self.cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            delay = time.monotonic() - start
+            self.queue_delay += (delay - self.queue_delay) * 0.1
+            self.max_queue_delay = max(self.max_queue_delay, delay)
+        return delay
+
+    def release(self, method, latency, overloaded):
+        """Free a slot; latency is None when the call was never answered, which gives no feedback"""
+        with self.cond:
+            saturated = self.waiting > 0 or self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if latency is None:
+                self.cond.notify_all()
+                return
+            self.counts["calls"] += 1
+            if overloaded:
+                self.counts["overloaded"] += 1
+                self.decrease(0.5)
+            else:
+                baseline = self.baselines.get(method)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    baseline += (latency - baseline) * 0.01  # drift up slowly so the baseline can recover
+                self.baselines[method] = baseline
+                self.latency += (latency - self.latency) * 0.2
+                self.latency_ratio += (latency / max(baseline, 0.001) - self.latency_ratio) * 0.2
+                if self.latency_ratio > UPSTREAM_LATENCY_TOLERANCE:
+                    self.decrease(max(0.5, UPSTREAM_LATENCY_TOLERANCE / self.latency_ratio))
+                elif saturated:
+                    self.limit = min(float(UPSTREAM_MAX_CONCURRENCY), self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+    def decrease(self, factor):
+        # At most one decrease per round trip, so one burst of failures halves the limit once
+        now = time.monotonic()
+        if now - self.last_decrease < max(self.latency, 0.1):
+            return
+        self.last_decrease = now
+        self.counts["decreases"] += 1
+        self.limit = max(float(UPSTREAM_MIN_CONCURRENCY), self.limit * factor)
+
+    def status(self):
+        with self.cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "queue_delay_ms": round(self.queue_delay * 1000, 1),
+                "max_queue_delay_ms": round(self.max_queue_delay * 1000, 1),
+                "latency_ms": round(self.latency * 1000, 1),
+                "latency_ratio": round(self.latency_ratio, 2),
+                "calls": self.counts["calls"],
+                "overloaded": self.counts["overloaded"],
+                "decreases": self.counts["decreases"],
+                "queue_timeouts": self.counts["queue_timeouts"]
+            }
+
+class RateLimiter:
+    """Token bucket holding one base to AIRTABLE_RATE_LIMIT requests per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Reserve a token, sleeping until it is due; returns the time waited"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class AirtableBase:
+    """One Airtable base with its own token, connection pool, rate limit and concurrency limit"""
+
+    def __init__(self, base_id, api_key):
+        self.base_id = base_id
+        self.url = f"https://api.airtable.com/v0/{base_id}"
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self.session = requests.Session()
+        self.rate = RateLimiter(AIRTABLE_RATE_LIMIT)
+        self.limiter = ConcurrencyLimiter()
+
+def configured_bases():
+    """BASE_ID, or every base in AIRTABLE_BASES with the matching token from AIRTABLE_API_KEYS"""
+    base_ids = [b.strip() for b in os.getenv("AIRTABLE_BASES", "").split(",") if b.strip()] or [BASE_ID]
+    api_keys = [k.strip() for k in os.getenv("AIRTABLE_API_KEYS", "").split(",")]
+    return [AirtableBase(base_id, api_keys[i] if i < len(api_keys) and api_keys[i] else AIRTABLE_API_KEY)
+            for i, base_id in enumerate(base_ids)]
+
+bases = configured_bases()
+
+# Tables split across all bases: table -> field whose hash picks the base, or "day"/"month" by creation time
+SHARDED_TABLES = dict(entry.split(":", 1) for entry in os.getenv("SHARDED_TABLES", "Heartbeats:Cell_ID").split(",")
+                      if ":" in entry)
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))
+
+record_shards = {}  # record id -> base index, for records of sharded tables
+record_shards_lock = threading.Lock()
+shard_pool = concurrent.futures.ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard")
+
+def shard_count(table):
+    return len(bases) if table in SHARDED_TABLES else 1
+
+def shard_for_fields(table, fields, created_time=None):
+    """Base index for a record of a sharded table"""
+    strategy = SHARDED_TABLES[table]
+    if strategy in ("day", "month"):
+        moment = datetime.fromisoformat(created_time.replace("Z", "+00:00")) if created_time else datetime.utcnow()
+        period = moment.toordinal() if strategy == "day" else moment.year * 12 + moment.month
+        return period % len(bases)
+    return int(hashlib.md5(str(fields.get(strategy, "")).encode()).hexdigest(), 16) % len(bases)
+
+def remember_shards(records, shard):
+    load_section("record_shards")
+    with record_shards_lock:
+        for record in records:
+            if "id" in record:
+                record_shards[record["id"]] = shard
+
+def forget_shards(record_ids):
+    load_section("record_shards")
+    with record_shards_lock:
+        for record_id in record_ids:
+            record_shards.pop(record_id, None)
+
+def locate_record(table, record_id):
+    """Base index holding a record, probing each base the first time an id is seen"""
+    load_section("record_shards")
+    with record_shards_lock:
+        if record_id in record_shards:
+            return record_shards[record_id]
+    for shard in range(shard_count(table)):
+        if airtable_request("GET", table, record_id, shard=shard).status_code == 200:
+            return shard  # remembered by airtable_request
+    return 0
+
+class ShardedResponse:
+    """Responses from several bases merged into one, looking like a requests.Response"""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return self.data
+
+def fan_out(calls):
+    """Run (shard, kwargs) calls in parallel, keeping the caller's trace context"""
+    futures = [shard_pool.submit(contextvars.copy_context().run, airtable_request, *args, **kwargs)
+               for args, kwargs in calls]
+    return [future.result() for future in futures]
+
+def merge_responses(responses):
+    failed = [response for response in responses if response.status_code != 200]
+    if failed:
+        return failed[0]
+    merged = {}
+    for response in responses:
+        for key, value in response.json().items():
+            if isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            else:
+                merged[key] = value
+    merged.setdefault("records", [])
+    return ShardedResponse(200, merged)
+
+def sharded_request(method, table, record_id=None, **kwargs):
+    """Route a request for a sharded table to the bases holding its records and merge the results"""
+    if record_id:
+        return airtable_request(method, table, record_id, shard=locate_record(table, record_id), **kwargs)
+    if method == "GET":
+        return merge_responses(fan_out([((method, table), dict(kwargs, shard=shard))
+                                        for shard in range(shard_count(table))]))
+
+    groups = collections.defaultdict(list)
+    if method == "DELETE":
+        params = kwargs.pop("params", [])
+        for key, value in params:
+            groups[locate_record(table, value)].append((key, value))
+        calls = [((method, table), dict(kwargs, shard=shard, params=group)) for shard, group in groups.items()]
+    else:
+        payload = kwargs.pop("json")
+        for record in payload["records"]:
+            shard = (locate_record(table, record["id"]) if "id" in record
+                     else shard_for_fields(table, record.get("fields", {})))
+            groups[shard].append(record)
+        calls = [((method, table), dict(kwargs, shard=shard, json=dict(payload, records=group)))
+                 for shard, group in groups.items()]
+    return merge_responses(fan_out(calls))
+
+def airtable_request(method, table, record_id=None, shard=None, **kwargs):
+    """Send a request to Airtable through the table's circuit breaker, the base's rate limit and
+    its adaptive concurrency limit. Requests for sharded tables are routed to the right bases."""
+    if shard is None and shard_count(table) > 1:
+        return sharded_request(method, table, record_id, **kwargs)
+    base = bases[shard or 0]
+    breaker = get_breaker(f"{table}@{base.base_id}" if shard else table)
+    if breaker.is_open():  # fail fast without queueing; allow() below claims any half-open probe
+        raise UpstreamUnavailableError(table, "circuit open", breaker.retry_after())
+
+    url = f"{base.url}/{table}/{record_id}" if record_id else f"{base.url}/{table}"
+    with span(f"airtable {method} {table}", kind="client", table=table, method=method, retries=0,
+              base=base.base_id) as call:
+        throttled = base.rate.acquire()
+        queued = base.limiter.acquire(table)
+        latency, overloaded, settled = None, True, False
+        try:
+            # Ask the breaker only once a slot is held, so a half-open probe is never stranded in the queue
+            if not breaker.allow():
+                settled = True
+                raise UpstreamUnavailableError(table, "circuit open", breaker.retry_after())
+            started = time.monotonic()
+            try:
+                response = base.session.request(method, url, headers=base.headers,
+                                                timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT), **kwargs)
+            except requests.RequestException as e:
+                latency = time.monotonic() - started
+                breaker.record_failure()
+                settled = True
+                raise UpstreamUnavailableError(table, type(e).__name__, breaker.retry_after() or None)
+            latency = time.monotonic() - started
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            call.set(status=response.status_code, bytes=len(response.content), queue_ms=round(queued * 1000, 1),
+                     rate_wait_ms=round(throttled * 1000, 1))
+        finally:
+            base.limiter.release(method, latency, overloaded)
+            if not settled:
+                if overloaded:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+    if shard_count(table) > 1 and response.status_code == 200:
+        data = response.json()
+        if method == "DELETE":
+            forget_shards(record["id"] for record in data.get("records", [data]) if "id" in record)
+        else:
+            remember_shards(data.get("records", [data]), shard)
+    return response
+
+def export_record_shards():
+    with record_shards_lock:
+        return {"bases": [base.base_id for base in bases], "records": dict(record_shards)}
+
+def restore_record_shards(state):
+    # Only valid while the same bases are configured in the same order
+    if state.get("bases") == [base.base_id for base in bases]:
+        with record_shards_lock:
+            record_shards.update(state.get("records", {}))
+
+@app.exception_handler(UpstreamUnavailableError)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailableError):
+    retry_headers = {"Retry-After": str(int(exc.retry_after) + 1)} if exc.retry_after else {}
+    return JSONResponse(status_code=503, content={"error": str(exc)}, headers=retry_headers)
+
+# Read cache configuration
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data/cache_snapshot.bin")
+SNAPSHOT_MAGIC = b"ATSNAP1\n"
+
+# In-memory read cache: table -> {"data", "fetched_at", "stale", "dirty", "blob"}
+# "stale" entries are served while revalidating, "dirty" ones (after a write) are refetched first.
+# "blob" is an (offset, length) into the mmapped snapshot, decoded on first use
+table_cache = {}
+cache_lock = threading.Lock()
+table_locks = {}
+refreshing_tables = set()
+snapshot_map = None
+
+# Extra in-memory state saved with the snapshot: name -> (export_fn, restore_fn, lazy)
+# Lazy sections stay compressed in the mapped snapshot until load_section() is first called for them
+snapshot_sections = {}
+pending_sections = {}  # name -> (offset, length) into snapshot_map
+section_lock = threading.Lock()
+
+def load_section(name):
+    """Restore a lazily loaded snapshot section the first time its state is needed"""
+    if name not in pending_sections:
+        return
+    with section_lock:
+        if name not in pending_sections:
+            return
+        offset, length = pending_sections[name]
+        try:
+            snapshot_sections[name][1](json.loads(zlib.decompress(snapshot_map[offset:offset + length])))
+        finally:
+            # A section that fails to restore is dropped rather than retried on every lookup
+            del pending_sections[name]
+
+def load_pending_sections():
+    # Warms lazy sections after startup; a lookup that gets there first restores its section itself
+    for name in list(pending_sections):
+        try:
+            load_section(name)
+        except Exception as e:
+            print(f"❌ Snapshot section {name} load error: {str(e)}")
+
+def get_table_lock(table):
+    with cache_lock:
+        return table_locks.setdefault(table, threading.Lock())
+
+def get_cached(table):
+    """Return the cache entry for a table, decoding it from the snapshot if needed"""
+    with cache_lock:
+        entry = table_cache.get(table)
+        if entry is None:
+            return None
+        if entry["data"] is None and entry.get("blob"):
+            offset, length = entry["blob"]
+            entry["data"] = json.loads(zlib.decompress(snapshot_map[offset:offset + length]))
+            entry["blob"] = None
+        return entry
+
+def store_cached(table, data):
+    with cache_lock:
+        table_cache[table] = {"data": data, "fetched_at": time.time(), "stale": False, "dirty": False,
+                              "blob": None}
+    index_records(table, data.get("records", []), complete="offset" not in data)
+
+def invalidate_table(table):
+    """Force the next read of a table to go upstream, keeping the data as a fallback"""
+    with cache_lock:
+        entry = table_cache.get(table)
+        if entry is not None:
+            entry["stale"] = True
+            entry["dirty"] = True
+
+def load_table(table):
+    response = airtable_request("GET", table)
+    if response.status_code == 429 or response.status_code >= 500:
+        raise UpstreamUnavailableError(table, f"HTTP {response.status_code}")
+    with span("json.decode", table=table, bytes=len(response.content)):
+        data = response.json()
+    if response.status_code == 200:
+        store_cached(table, data)
+    return data
+
+def iter_table_pages(table, params=None):
+    """Yield every page of records from a table, following Airtable's offset cursor (base by base if sharded)"""
+    flush_before_read(table)
+    params = list(params or []) + [("pageSize", 100)]
+    for shard in range(shard_count(table)):
+        offset = None
+        while True:
+            page_params = params + [("offset", offset)] if offset else params
+            response = airtable_request("GET", table, shard=shard, params=page_params)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise UpstreamUnavailableError(table, f"HTTP {response.status_code}")
+            data = response.json()
+            if response.status_code != 200:
+                raise ValueError(data.get("error", data))
+            yield data.get("records", [])
+            offset = data.get("offset")
+            if not offset:
+                break
+
+def fetch_table(table):
+    """Read a table from Airtable and refresh its cache entry"""
+    with get_table_lock(table):
+        return load_table(table)
+
+def refresh_in_background(table):
+    with cache_lock:
+        if table in refreshing_tables:
+            return
+        refreshing_tables.add(table)
+
+    def run():
+        try:
+            if get_breaker(table).is_open():
+                return
+            fetch_table(table)
+            print(f"🔄 Refreshed {table} cache")
+        except Exception as e:
+            print(f"❌ Refresh {table} error: {str(e)}")
+        finally:
+            with cache_lock:
+                refreshing_tables.discard(table)
+
+    threading.Thread(target=run, daemon=True).start()
+
+def set_cache_headers(response, table, entry, revalidation_failed=False):
+    """Add Age/Warning headers describing how old the served table data is"""
+    if response is None:
+        return
+    age = int(time.time() - entry["fetched_at"])
+    response.headers["Age"] = str(max(age, int(response.headers.get("Age", "0"))))
+    warnings = [w for w in response.headers.get("Warning", "").split(", ") if w]
+    if entry["stale"] or age > CACHE_TTL_SECONDS:
+        warnings.append('110 - "Response is Stale"')
+    if revalidation_failed or get_breaker(table).is_open():
+        warnings.append('111 - "Revalidation Failed"')
+    if warnings:
+        response.headers["Warning"] = ", ".join(dict.fromkeys(warnings))
+
+def read_table(table, response=None):
+    """Serve a table from cache, revalidating stale entries in the background.
+
+    Falls back to the last known-good data when Airtable is unavailable.
+    """
+    flush_before_read(table)
+    entry = get_cached(table)
+    if entry is None or entry["dirty"]:
+        try:
+            with get_table_lock(table):
+                current = get_cached(table)
+                if current is None or current["dirty"]:
+                    return load_table(table)
+                # Another request refreshed the cache while we waited
+                entry = current
+        except UpstreamUnavailableError:
+            if entry is None:
+                raise
+            print(f"⚠️ Serving last known-good {table} data")
+            set_cache_headers(response, table, entry, revalidation_failed=True)
+            return entry["data"]
+    if entry["stale"] or time.time() - entry["fetched_at"] > CACHE_TTL_SECONDS:
+        refresh_in_background(table)
+    set_cache_headers(response, table, entry)
+    return entry["data"]
+
+# Business-key hash indexes, fed by cached reads and the server's own writes
+INDEXED_FIELDS = {
+    "Sprints": ["Sprint_ID"],
+    "Proof": ["Sprint_ID", "Proof_ID"],
+    "Cells": ["Cell_ID"],
+    "Heartbeats": ["Cell_ID"]
 }
+INDEX_HEARTBEATS_PER_CELL = int(os.getenv("INDEX_HEARTBEATS_PER_CELL", "50"))
+
+indexed_records = {table: {} for table in INDEXED_FIELDS}  # table -> record id -> record
+key_indexes = {(table, field): {} for table, fields in INDEXED_FIELDS.items() for field in fields}  # -> key -> record ids
+complete_tables = set()  # whole table has been indexed at least once
+complete_keys = {index: set() for index in key_indexes}  # keys whose records were all fetched upstream
+index_lock = threading.Lock()
+
+def unindex_locked(table, record_id):
+    record = indexed_records[table].pop(record_id, None)
+    if record is None:
+        return
+    for field in INDEXED_FIELDS[table]:
+        key = record.get("fields", {}).get(field)
+        bucket = key_indexes[(table, field)].get(key)
+        if bucket is not None:
+            bucket.discard(record_id)
+            if not bucket:
+                del key_indexes[(table, field)][key]
+
+def index_locked(table, records):
+    for record in records:
+        if "id" not in record or "fields" not in record:
+            continue
+        unindex_locked(table, record["id"])
+        indexed_records[table][record["id"]] = record
+        for field in INDEXED_FIELDS[table]:
+            key = record["fields"].get(field)
+            if key is None:
+                continue
+            bucket = key_indexes[(table, field)].setdefault(key, set())
+            bucket.add(record["id"])
+            if table == "Heartbeats" and len(bucket) > INDEX_HEARTBEATS_PER_CELL:
+                # Keep only the most recent heartbeats per cell
+                oldest = min(bucket, key=lambda rid: indexed_records[table][rid].get("createdTime", ""))
+                unindex_locked(table, oldest)
+
+def index_records(table, records, complete=None):
+    """Add or refresh records in the table's business-key indexes.
+
+    complete is True for a whole-table read, which replaces the table's index so records deleted in
+    Airtable drop out, and False for a table read that stopped at its first page; None for other records.
+    """
+    if table not in INDEXED_FIELDS:
+        return
+    load_section("indexes")
+    with index_lock:
+        if complete:
+            indexed_records[table].clear()
+            for field in INDEXED_FIELDS[table]:
+                key_indexes[(table, field)].clear()
+                complete_keys[(table, field)].clear()
+        index_locked(table, records)
+        if complete:
+            complete_tables.add(table)
+        elif complete is False:
+            # The table outgrew one page: keys on later pages must be queried again
+            complete_tables.discard(table)
+
+def unindex_records(table, record_ids):
+    if table not in INDEXED_FIELDS:
+        return
+    load_section("indexes")
+    with index_lock:
+        for record_id in record_ids:
+            unindex_locked(table, record_id)
+
+def apply_write(table, response):
+    """Invalidate the table cache and index the records returned by a successful write"""
+    invalidate_table(table)
+    if response.status_code == 200:
+        records = response.json().get("records", [])
+        index_records(table, records)
+        count_records(table, records)
+
+def indexed_by_key(table, field, key):
+    """Records already in the index for this key, without going upstream"""
+    flush_before_read(table)
+    load_section("indexes")
+    with index_lock:
+        return [indexed_records[table][rid] for rid in key_indexes[(table, field)].get(key, ())]
+
+def lookup_by_key(table, field, key):
+    """Records whose business key matches; two dict lookups when warm, one filtered query when cold"""
+    flush_before_read(table)
+    load_section("indexes")
+    with index_lock:
+        if table in complete_tables or key in complete_keys[(table, field)]:
+            return [indexed_records[table][rid] for rid in key_indexes[(table, field)].get(key, ())]
+
+    escaped = key.replace("\\", "\\\\").replace("'", "\\'")
+    params = [("filterByFormula", f"{{{field}}} = '{escaped}'")]
+    if table == "Heartbeats":
+        # Only the most recent heartbeats are indexed per cell
+        params += [("sort[0][field]", "Timestamp"), ("sort[0][direction]", "desc"),
+                   ("maxRecords", INDEX_HEARTBEATS_PER_CELL)]
+    records = [record for page in iter_table_pages(table, params) for record in page]
+    index_records(table, records)
+    with index_lock:
+        complete_keys[(table, field)].add(key)
+        return [indexed_records[table][rid] for rid in key_indexes[(table, field)].get(key, ())]
+
+def export_indexes():
+    """Indexed records by id when they are the cached table's own records, in full only otherwise"""
+    cached = {}
+    for table in INDEXED_FIELDS:
+        entry = get_cached(table)
+        records = entry["data"].get("records", []) if entry and entry["data"] else []
+        cached[table] = {record["id"]: record for record in records if "id" in record}
+    with index_lock:
+        ids, extra = {}, {}
+        for table, records in indexed_records.items():
+            for record_id, record in records.items():
+                if cached[table].get(record_id) is record:
+                    ids.setdefault(table, []).append(record_id)
+                else:
+                    extra.setdefault(table, []).append(record)
+        return {
+            "ids": ids,
+            "records": extra,
+            "complete_tables": sorted(complete_tables),
+            "complete_keys": {f"{table}|{field}": sorted(keys) for (table, field), keys in complete_keys.items()}
+        }
+
+def restore_indexes(state):
+    for table in INDEXED_FIELDS:
+        records = state.get("records", {}).get(table, [])
+        if state.get("ids", {}).get(table):
+            entry = get_cached(table)
+            cached = {record["id"]: record for record in (entry["data"] if entry and entry["data"] else {}).get("records", [])}
+            records = [cached[rid] for rid in state["ids"][table] if rid in cached] + records
+        with index_lock:
+            index_locked(table, records)
+    with index_lock:
+        complete_tables.update(t for t in state.get("complete_tables", []) if t in INDEXED_FIELDS)
+        for name, keys in state.get("complete_keys", {}).items():
+            table, field = name.split("|", 1)
+            if (table, field) in complete_keys:
+                complete_keys[(table, field)].update(keys)
+
+snapshot_sections["indexes"] = (export_indexes, restore_indexes, True)
+snapshot_sections["record_shards"] = (export_record_shards, restore_record_shards, True)
+
+def save_snapshot():
+    """Write the table cache and registered state to SNAPSHOT_PATH atomically"""
+    try:
+        index = {"saved_at": time.time(), "tables": {}, "sections": {}}
+        blobs = []
+        offset = 0
+        for table in list(table_cache):
+            with cache_lock:
+                entry = table_cache.get(table)
+                if entry is None:
+                    continue
+                data, fetched_at, mapped = entry["data"], entry["fetched_at"], entry.get("blob")
+            if data is not None:
+                blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 1)
+            elif mapped:
+                # Never decoded since the last load: copy the compressed bytes as they are
+                blob = snapshot_map[mapped[0]:mapped[0] + mapped[1]]
+            else:
+                continue
+            index["tables"][table] = [offset, len(blob), fetched_at]
+            blobs.append(blob)
+            offset += len(blob)
+        for name, (export_fn, _, _) in snapshot_sections.items():
+            with section_lock:
+                pending = pending_sections.get(name)
+                if pending:
+                    blob = snapshot_map[pending[0]:pending[0] + pending[1]]
+            if not pending:
+                blob = zlib.compress(json.dumps(export_fn(), separators=(",", ":")).encode(), 1)
+            index["sections"][name] = [offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = json.dumps(index, separators=(",", ":")).encode()
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH) or ".", exist_ok=True)
+        tmp_path = f"{SNAPSHOT_PATH}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack(">I", len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+        print(f"💾 Snapshot saved: {len(index['tables'])} tables, {offset} bytes")
+    except Exception as e:
+        print(f"❌ Snapshot save error: {str(e)}")
+
+def load_snapshot():
+    """Map the snapshot file and register its tables as stale cache entries.
+
+    Lazy sections are only located here and restored on first use.
+    """
+    global snapshot_map
+    try:
+        if not os.path.exists(SNAPSHOT_PATH):
+            print("💾 No snapshot found, starting cold")
+            return
+        with open(SNAPSHOT_PATH, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            print("❌ Snapshot has an unknown format, ignoring it")
+            return
+        start = len(SNAPSHOT_MAGIC)
+        (header_length,) = struct.unpack(">I", mapped[start:start + 4])
+        index = json.loads(mapped[start + 4:start + 4 + header_length])
+        base = start + 4 + header_length
+
+        snapshot_map = mapped
+        with cache_lock:
+            for table, (offset, length, fetched_at) in index["tables"].items():
+                table_cache[table] = {"data": None, "fetched_at": fetched_at, "stale": True, "dirty": False,
+                                      "blob": (base + offset, length)}
+        for name, (offset, length) in index.get("sections", {}).items():
+            if name not in snapshot_sections:
+                continue
+            _, restore_fn, lazy = snapshot_sections[name]
+            if lazy:
+                with section_lock:
+                    pending_sections[name] = (base + offset, length)
+            else:
+                restore_fn(json.loads(zlib.decompress(mapped[base + offset:base + offset + length])))
+
+        age = time.time() - index["saved_at"]
+        print(f"💾 Snapshot loaded: {len(index['tables'])} tables, {age:.0f}s old")
+    except Exception as e:
+        print(f"❌ Snapshot load error: {str(e)}")
 
 @app.get("/")
 def root():
@@ -39,7 +1191,10 @@ def root():
             "cells": "/cells",
             "proof": "/proof",
             "heartbeats": "/heartbeats",
-            "webhooks": ["/webhook", "/proof-webhook", "/heartbeat-webhook"]
+            "webhooks": ["/webhook", "/proof-webhook", "/heartbeat-webhook"],
+            "streams": ["/stream/heartbeats", "/stream/proof"],
+            "upstream_status": "/upstream-status",
+            "upstream_concurrency": "/upstream-concurrency"
         },
         "access": [
             "https://drop2.fullpotential.ai",
@@ -116,7 +1271,8 @@ def write_sample_data():
     
     for table_name, data in tables.items():
         try:
-            response = requests.post(f"{BASE_URL}/{table_name}", headers=headers, json=data)
+            response = airtable_request("POST", table_name, json=data)
+            apply_write(table_name, response)
             results[table_name] = {"status": response.status_code, "response": response.json()}
             print(f"✅ {table_name}: {response.status_code}")
         except Exception as e:
@@ -126,63 +1282,289 @@ def write_sample_data():
     return results
 
 @app.get("/read")
-def read_records():
+def read_records(response: Response):
     """Fetch records from all Airtable tables"""
     results = {}
     tables = ["Sprints", "Cells", "Proof", "Heartbeats"]
     
     for table in tables:
         try:
-            response = requests.get(f"{BASE_URL}/{table}", headers=headers)
-            results[table] = response.json()
-            print(f"📖 Read {table}: {len(response.json().get('records', []))} records")
+            results[table] = read_table(table, response)
+            print(f"📖 Read {table}: {len(results[table].get('records', []))} records")
         except Exception as e:
             results[table] = {"error": str(e)}
             print(f"❌ Read {table}: {str(e)}")
     
     return results
 
+# Webhook body handling
+WEBHOOK_MAX_BYTES = int(os.getenv("WEBHOOK_MAX_BYTES", "65536"))
+WEBHOOK_MAX_DEPTH = int(os.getenv("WEBHOOK_MAX_DEPTH", "20"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+json_loads = orjson.loads if orjson else json.loads
+
+class ProofEvent(BaseModel):
+    """Proof webhook payload; accepts Airtable field names or snake_case keys"""
+    model_config = ConfigDict(extra="allow")
+
+    Proof_ID: str = Field(validation_alias=AliasChoices("Proof_ID", "proof_id"), max_length=200)
+    Sprint_ID: Optional[str] = Field(None, validation_alias=AliasChoices("Sprint_ID", "sprint_id"), max_length=200)
+    Result: Optional[str] = Field(None, validation_alias=AliasChoices("Result", "result"))
+    Token: Optional[str] = Field(None, validation_alias=AliasChoices("Token", "token"))
+    Timestamp: Optional[str] = Field(None, validation_alias=AliasChoices("Timestamp", "timestamp"))
+
+class HeartbeatEvent(BaseModel):
+    """Heartbeat webhook payload; accepts Airtable field names or snake_case keys"""
+    model_config = ConfigDict(extra="allow")
+
+    Cell_ID: str = Field(validation_alias=AliasChoices("Cell_ID", "cell_id"), max_length=200)
+    CPU_Usage: Optional[float] = Field(None, validation_alias=AliasChoices("CPU_Usage", "cpu_usage", "cpu"))
+    RAM_Usage: Optional[float] = Field(None, validation_alias=AliasChoices("RAM_Usage", "ram_usage", "ram"))
+    Status: Optional[str] = Field(None, validation_alias=AliasChoices("Status", "status"))
+    Timestamp: Optional[str] = Field(None, validation_alias=AliasChoices("Timestamp", "timestamp"))
+
+def json_depth_exceeds(value, limit):
+    stack = [(value, 1)]
+    while stack:
+        item, depth = stack.pop()
+        if depth > limit:
+            return True
+        if isinstance(item, dict):
+            stack.extend((child, depth + 1) for child in item.values())
+        elif isinstance(item, list):
+            stack.extend((child, depth + 1) for child in item)
+    return False
+
+async def read_webhook_body(request: Request):
+    """Read the body up to WEBHOOK_MAX_BYTES, verify its signature and decode it"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > WEBHOOK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body larger than {WEBHOOK_MAX_BYTES} bytes")
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > WEBHOOK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body larger than {WEBHOOK_MAX_BYTES} bytes")
+        chunks.append(chunk)
+    body = b"".join(chunks)
+
+    # Signature is checked on the raw bytes, before any parsing work
+    if WEBHOOK_SECRET:
+        expected = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(request.headers.get("x-signature-256", ""), expected):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        payload = json_loads(body)
+    except (ValueError, RecursionError):
+        raise HTTPException(status_code=422, detail="Body is not valid JSON")
+    if json_depth_exceeds(payload, WEBHOOK_MAX_DEPTH):
+        raise HTTPException(status_code=422, detail=f"Body nested deeper than {WEBHOOK_MAX_DEPTH} levels")
+    return body, payload
+
+def parse_webhook_event(model, payload):
+    try:
+        return model.model_validate(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
 @app.post("/webhook")
 async def webhook_handler(request: Request):
     """Receive POST requests and log payload"""
-    try:
-        payload = await request.json()
-        timestamp = datetime.now().isoformat()
-        
-        print(f"🔔 Webhook received at {timestamp}")
-        print(f"📦 Payload: {json.dumps(payload, indent=2)}")
-        
-        return {
-            "status": "received",
-            "timestamp": timestamp,
-            "payload": payload
-        }
-    except Exception as e:
-        print(f"❌ Webhook error: {str(e)}")
-        return {"error": str(e)}
+    body, payload = await read_webhook_body(request)
+    timestamp = datetime.now().isoformat()
+
+    print(f"🔔 Webhook received at {timestamp}")
+    print(f"📦 Payload ({len(body)} bytes): {body[:500].decode(errors='replace')}")
+
+    return {
+        "status": "received",
+        "timestamp": timestamp,
+        "payload": payload
+    }
 
 @app.post("/proof-webhook")
 async def proof_webhook(request: Request):
     """Handle proof webhooks"""
-    payload = await request.json()
-    print(f"🎯 Proof webhook: {json.dumps(payload, indent=2)}")
-    return {"status": "proof received", "data": payload}
+    _, payload = await read_webhook_body(request)
+    event = parse_webhook_event(ProofEvent, payload).model_dump(exclude_none=True)
+    print(f"🎯 Proof webhook: {event['Proof_ID']} for sprint {event.get('Sprint_ID', '-')}")
+    publish_event("proof", "proof", event, "webhook")
+    count_webhook_event("Proof", event)
+    return {"status": "proof received", "data": event}
 
 @app.post("/heartbeat-webhook")
 async def heartbeat_webhook(request: Request):
     """Handle heartbeat webhooks"""
-    payload = await request.json()
-    print(f"💓 Heartbeat webhook: {json.dumps(payload, indent=2)}")
-    return {"status": "heartbeat received", "data": payload}
+    _, payload = await read_webhook_body(request)
+    event = parse_webhook_event(HeartbeatEvent, payload).model_dump(exclude_none=True)
+    print(f"💓 Heartbeat webhook: {event['Cell_ID']} CPU {event.get('CPU_Usage', '-')} RAM {event.get('RAM_Usage', '-')}")
+    publish_event("heartbeats", "heartbeat", event, "webhook")
+    count_webhook_event("Heartbeats", event)
+    return {"status": "heartbeat received", "data": event}
+
+# Live event streams
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_CHANNELS = ("heartbeats", "proof")
+
+class Subscriber:
+    """One stream client: a bounded queue that drops its oldest event when full"""
+
+    def __init__(self, filters):
+        self.queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.filters = filters
+        self.dropped = 0
+
+    def matches(self, fields):
+        for key, value in self.filters.items():
+            if str(fields.get(key, fields.get(key.lower()))) != value:
+                return False
+        return True
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+stream_subscribers = {channel: set() for channel in STREAM_CHANNELS}
+stream_loop = None
+stream_event_ids = itertools.count(1)
+
+def deliver_event(channel, event):
+    for subscriber in list(stream_subscribers[channel]):
+        if subscriber.matches(event["fields"]):
+            subscriber.offer(event)
+
+def publish_event(channel, event_type, fields, source, record_id=None):
+    """Fan an event out to matching subscribers without ever waiting on them"""
+    if not stream_subscribers[channel]:
+        return
+    event = {
+        "id": next(stream_event_ids),
+        "type": event_type,
+        "source": source,
+        "record_id": record_id,
+        "fields": fields if isinstance(fields, dict) else {"payload": fields},
+        "received_at": datetime.now().isoformat()
+    }
+    try:
+        asyncio.get_running_loop()
+        deliver_event(channel, event)
+    except RuntimeError:
+        # Called from a worker thread: queues belong to the event loop
+        stream_loop.call_soon_threadsafe(deliver_event, channel, event)
+
+def subscribe(channel, cell_id=None, sprint_id=None):
+    global stream_loop
+    stream_loop = asyncio.get_running_loop()
+    filters = {}
+    if cell_id:
+        filters["Cell_ID"] = cell_id
+    if sprint_id:
+        filters["Sprint_ID"] = sprint_id
+    subscriber = Subscriber(filters)
+    stream_subscribers[channel].add(subscriber)
+    print(f"📡 Stream subscriber joined {channel} ({len(stream_subscribers[channel])} total)")
+    return subscriber
+
+def unsubscribe(channel, subscriber):
+    stream_subscribers[channel].discard(subscriber)
+    print(f"📡 Stream subscriber left {channel}, dropped {subscriber.dropped} events")
+
+async def sse_events(request, channel, cell_id=None, sprint_id=None):
+    # Subscribed here rather than in the handler, so a client gone before the stream starts never subscribes
+    subscriber = subscribe(channel, cell_id, sprint_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield f": keepalive dropped={subscriber.dropped}\n\n"
+                continue
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        unsubscribe(channel, subscriber)
+
+async def websocket_events(websocket, channel):
+    await websocket.accept()
+    subscriber = subscribe(channel, websocket.query_params.get("Cell_ID"), websocket.query_params.get("Sprint_ID"))
+
+    async def send_events():
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+
+    async def watch_disconnect():
+        # Clients never send anything, so receive() is what notices one that went away between events
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(watch_disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        unsubscribe(channel, subscriber)
+
+@app.get("/stream/heartbeats")
+async def stream_heartbeats(request: Request, Cell_ID: str = None):
+    """Server-Sent Events feed of new heartbeats, optionally for one Cell_ID"""
+    return StreamingResponse(sse_events(request, "heartbeats", cell_id=Cell_ID), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/proof")
+async def stream_proof(request: Request, Sprint_ID: str = None):
+    """Server-Sent Events feed of new proof records, optionally for one Sprint_ID"""
+    return StreamingResponse(sse_events(request, "proof", sprint_id=Sprint_ID), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/stream/heartbeats")
+async def stream_heartbeats_ws(websocket: WebSocket):
+    await websocket_events(websocket, "heartbeats")
+
+@app.websocket("/stream/proof")
+async def stream_proof_ws(websocket: WebSocket):
+    await websocket_events(websocket, "proof")
+
+@app.get("/upstream-status")
+def upstream_status():
+    """Circuit breaker state and cache age per table"""
+    status = {}
+    for table in sorted(set(breakers) | set(table_cache)):
+        entry = table_cache.get(table)
+        status[table] = {
+            "circuit": get_breaker(table).status(),
+            "cache_age_seconds": round(time.time() - entry["fetched_at"], 1) if entry else None
+        }
+    return status
+
+@app.get("/upstream-concurrency")
+def upstream_concurrency():
+    """Current adaptive concurrency limit, queueing delay and upstream latency per base"""
+    return {base.base_id: dict(base.limiter.status(), sharded_tables=sorted(SHARDED_TABLES) if len(bases) > 1 else [])
+            for base in bases}
 
 # Individual table endpoints
 @app.get("/sprints")
-def get_sprints():
+def get_sprints(response: Response):
     """Get all sprints"""
     try:
-        response = requests.get(f"{BASE_URL}/Sprints", headers=headers)
-        print(f"📖 Read Sprints: {len(response.json().get('records', []))} records")
-        return response.json()
+        data = read_table("Sprints", response)
+        print(f"📖 Read Sprints: {len(data.get('records', []))} records")
+        return data
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Read Sprints error: {str(e)}")
         return {"error": str(e)}
@@ -193,20 +1575,25 @@ async def create_sprint(request: Request):
     try:
         data = await request.json()
         payload = {"records": [{"fields": data}]}
-        response = requests.post(f"{BASE_URL}/Sprints", headers=headers, json=payload)
+        response = await asyncio.to_thread(airtable_request, "POST", "Sprints", json=payload)
+        apply_write("Sprints", response)
         print(f"✅ Created Sprint: {response.status_code}")
         return {"status": response.status_code, "data": response.json()}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Create Sprint error: {str(e)}")
         return {"error": str(e)}
 
 @app.get("/cells")
-def get_cells():
+def get_cells(response: Response):
     """Get all cells"""
     try:
-        response = requests.get(f"{BASE_URL}/Cells", headers=headers)
-        print(f"📖 Read Cells: {len(response.json().get('records', []))} records")
-        return response.json()
+        data = read_table("Cells", response)
+        print(f"📖 Read Cells: {len(data.get('records', []))} records")
+        return data
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Read Cells error: {str(e)}")
         return {"error": str(e)}
@@ -217,20 +1604,25 @@ async def create_cell(request: Request):
     try:
         data = await request.json()
         payload = {"records": [{"fields": data}]}
-        response = requests.post(f"{BASE_URL}/Cells", headers=headers, json=payload)
+        response = await asyncio.to_thread(airtable_request, "POST", "Cells", json=payload)
+        apply_write("Cells", response)
         print(f"✅ Created Cell: {response.status_code}")
         return {"status": response.status_code, "data": response.json()}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Create Cell error: {str(e)}")
         return {"error": str(e)}
 
 @app.get("/proof")
-def get_proof():
+def get_proof(response: Response):
     """Get all proof records"""
     try:
-        response = requests.get(f"{BASE_URL}/Proof", headers=headers)
-        print(f"📖 Read Proof: {len(response.json().get('records', []))} records")
-        return response.json()
+        data = read_table("Proof", response)
+        print(f"📖 Read Proof: {len(data.get('records', []))} records")
+        return data
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Read Proof error: {str(e)}")
         return {"error": str(e)}
@@ -241,20 +1633,31 @@ async def create_proof_record(request: Request):
     try:
         data = await request.json()
         payload = {"records": [{"fields": data}]}
-        response = requests.post(f"{BASE_URL}/Proof", headers=headers, json=payload)
+        response = await asyncio.to_thread(airtable_request, "POST", "Proof", json=payload)
+        apply_write("Proof", response)
+        if response.status_code == 200:
+            for record in response.json().get("records", []):
+                publish_event("proof", "proof", record.get("fields", {}), "api", record.get("id"))
         print(f"✅ Created Proof: {response.status_code}")
         return {"status": response.status_code, "data": response.json()}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Create Proof error: {str(e)}")
         return {"error": str(e)}
 
 @app.get("/heartbeats")
-def get_heartbeats():
-    """Get all heartbeats"""
+def get_heartbeats(response: Response):
+    """Get all heartbeats, with hourly roll-ups of compacted heartbeats under rollups"""
     try:
-        response = requests.get(f"{BASE_URL}/Heartbeats", headers=headers)
-        print(f"📖 Read Heartbeats: {len(response.json().get('records', []))} records")
-        return response.json()
+        data = read_table("Heartbeats", response)
+        print(f"📖 Read Heartbeats: {len(data.get('records', []))} records")
+        rollups = read_hourly_rollups()
+        if rollups is not None:
+            data = dict(data, rollups=rollups)
+        return data
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Read Heartbeats error: {str(e)}")
         return {"error": str(e)}
@@ -265,23 +1668,285 @@ async def create_heartbeat(request: Request):
     try:
         data = await request.json()
         payload = {"records": [{"fields": data}]}
-        response = requests.post(f"{BASE_URL}/Heartbeats", headers=headers, json=payload)
+        response = await asyncio.to_thread(airtable_request, "POST", "Heartbeats", json=payload)
+        apply_write("Heartbeats", response)
+        if response.status_code == 200:
+            for record in response.json().get("records", []):
+                publish_event("heartbeats", "heartbeat", record.get("fields", {}), "api", record.get("id"))
         print(f"✅ Created Heartbeat: {response.status_code}")
         return {"status": response.status_code, "data": response.json()}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Create Heartbeat error: {str(e)}")
         return {"error": str(e)}
 
+# Cross-table joins
+@app.get("/sprints/{sprint_id}/full")
+def get_sprint_full(sprint_id: str):
+    """Sprint by Sprint_ID together with its proof records"""
+    try:
+        sprints = lookup_by_key("Sprints", "Sprint_ID", sprint_id)
+        if not sprints:
+            raise HTTPException(status_code=404, detail=f"Sprint {sprint_id} not found")
+        proofs = lookup_by_key("Proof", "Sprint_ID", sprint_id)
+        print(f"🔗 Sprint {sprint_id}: {len(proofs)} proofs")
+        return {"sprint": sprints[0], "proofs": sorted(proofs, key=lambda p: p.get("createdTime", ""))}
+    except (HTTPException, UpstreamUnavailableError):
+        raise
+    except Exception as e:
+        print(f"❌ Sprint join error: {str(e)}")
+        return {"error": str(e)}
+
+@app.get("/cells/{cell_id}/full")
+def get_cell_full(cell_id: str, limit: int = 20):
+    """Cell by Cell_ID together with its most recent heartbeats"""
+    try:
+        cells = lookup_by_key("Cells", "Cell_ID", cell_id)
+        if not cells:
+            raise HTTPException(status_code=404, detail=f"Cell {cell_id} not found")
+        heartbeats = lookup_by_key("Heartbeats", "Cell_ID", cell_id)
+        recent = sorted(heartbeats, key=lambda h: h.get("createdTime", ""), reverse=True)[:limit]
+        print(f"🔗 Cell {cell_id}: {len(recent)} heartbeats")
+        return {"cell": cells[0], "heartbeats": recent}
+    except (HTTPException, UpstreamUnavailableError):
+        raise
+    except Exception as e:
+        print(f"❌ Cell join error: {str(e)}")
+        return {"error": str(e)}
+
+# Business-key operations
+BUSINESS_KEYS = {
+    "sprints": ("Sprints", "Sprint_ID"),
+    "cells": ("Cells", "Cell_ID"),
+    "proof": ("Proof", "Proof_ID")
+}
+
+def business_key(table):
+    if table not in BUSINESS_KEYS:
+        raise HTTPException(status_code=404, detail=f"No business key for {table}")
+    return BUSINESS_KEYS[table]
+
+def upsert_records(table_name, key_field, records):
+    """Create or update records matched on key_field, 10 per performUpsert request"""
+    flush_updates(table_name)  # queued PUTs must not land after this write
+    created, updated, results = [], [], []
+    for batch in batches(records):
+        payload = {"performUpsert": {"fieldsToMergeOn": [key_field]},
+                   "records": [{"fields": fields} for fields in batch]}
+        response = airtable_request("PATCH", table_name, json=payload)
+        apply_write(table_name, response)
+        data = response.json()
+        if response.status_code != 200:
+            return response.status_code, {"error": data.get("error", data), "created": created, "updated": updated}
+        created += data.get("createdRecords", [])
+        updated += data.get("updatedRecords", [])
+        results += data.get("records", [])
+    return 200, {"created": created, "updated": updated, "records": results}
+
+@app.get("/{table}/by-key/{key}")
+def get_by_key(table: str, key: str):
+    """Get a record by Sprint_ID, Cell_ID or Proof_ID"""
+    table_name, key_field = business_key(table)
+    try:
+        records = indexed_by_key(table_name, key_field, key) or lookup_by_key(table_name, key_field, key)
+        if not records:
+            raise HTTPException(status_code=404, detail=f"{key_field} {key} not found")
+        print(f"🔑 Found {table_name} {key}: {records[0]['id']}")
+        return records[0]
+    except (HTTPException, UpstreamUnavailableError):
+        raise
+    except Exception as e:
+        print(f"❌ Get {table_name} error: {str(e)}")
+        return {"error": str(e)}
+
+@app.put("/{table}/by-key/{key}")
+async def upsert_by_key(table: str, key: str, request: Request):
+    """Create or update the record with this business key in a single upsert"""
+    table_name, key_field = business_key(table)
+    data = await request.json()
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=422, detail="Body must be an object of fields")
+    try:
+        records = [dict(data, **{key_field: key})]
+        status, result = await asyncio.to_thread(upsert_records, table_name, key_field, records)
+        print(f"✅ Upserted {table_name} {key}: {status}")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
+    except Exception as e:
+        print(f"❌ Upsert {table_name} error: {str(e)}")
+        return {"error": str(e)}
+
+@app.delete("/{table}/by-key/{key}")
+def delete_by_key(table: str, key: str):
+    """Delete every record with this business key"""
+    table_name, key_field = business_key(table)
+    try:
+        record_ids = [record["id"] for record in lookup_by_key(table_name, key_field, key)]
+        if not record_ids:
+            raise HTTPException(status_code=404, detail=f"{key_field} {key} not found")
+        delete_records(table_name, record_ids)
+        uncount_records(record_ids)
+        print(f"✅ Deleted {table_name} {key}: {len(record_ids)} records")
+        return {"status": 200, "message": f"Deleted {len(record_ids)} records", "deleted": record_ids}
+    except (HTTPException, UpstreamUnavailableError):
+        raise
+    except Exception as e:
+        print(f"❌ Delete {table_name} error: {str(e)}")
+        return {"error": str(e)}
+
+@app.post("/{table}/upsert")
+async def bulk_upsert(table: str, request: Request):
+    """Create or update many records matched on their business key"""
+    table_name, key_field = business_key(table)
+    data = await request.json()
+    records = data.get("records", []) if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise HTTPException(status_code=422, detail="Expected a list of records")
+    invalid = [i for i, record in enumerate(records)
+               if not isinstance(record, dict) or not isinstance(record.get("fields", record), dict)]
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Records {invalid} are not objects of fields")
+    records = [record.get("fields", record) for record in records]
+    missing = [i for i, fields in enumerate(records) if not fields.get(key_field)]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Records {missing} have no {key_field}")
+    try:
+        status, result = await asyncio.to_thread(upsert_records, table_name, key_field, records)
+        print(f"✅ Upserted {len(records)} {table_name}: {len(result['created'])} created, {len(result['updated'])} updated")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
+    except Exception as e:
+        print(f"❌ Bulk upsert {table_name} error: {str(e)}")
+        return {"error": str(e)}
+
+# Write-behind updates: PUTs are merged per record and sent as 10-record PATCH batches
+WRITE_BEHIND_SECONDS = float(os.getenv("WRITE_BEHIND_SECONDS", "0"))  # 0 sends every update immediately
+WRITE_BEHIND_TABLES = set(filter(None, os.getenv("WRITE_BEHIND_TABLES", "Cells,Heartbeats").split(",")))
+
+pending_updates = {}  # table -> record id -> merged fields
+pending_lock = threading.Lock()
+flush_locks = {}
+flush_timers = {}
+
+def get_flush_lock(table):
+    with pending_lock:
+        return flush_locks.setdefault(table, threading.Lock())
+
+def queue_update(table, record_id, fields):
+    """Merge fields into the record's pending update, last writer wins per field"""
+    with pending_lock:
+        merged = pending_updates.setdefault(table, {}).setdefault(record_id, {})
+        merged.update(fields)
+        merged = dict(merged)
+        schedule_flush_locked(table, WRITE_BEHIND_SECONDS)
+    return merged
+
+def schedule_flush_locked(table, delay):
+    if table in flush_timers:
+        return
+    timer = threading.Timer(delay, flush_from_timer, args=(table,))
+    timer.daemon = True
+    flush_timers[table] = timer
+    timer.start()
+
+def flush_from_timer(table):
+    with pending_lock:
+        flush_timers.pop(table, None)
+    try:
+        flush_updates(table)
+    except Exception as e:
+        print(f"❌ Write-behind {table} flush error: {str(e)}")
+
+def discard_pending_updates(table, record_ids):
+    with pending_lock:
+        for record_id in record_ids:
+            pending_updates.get(table, {}).pop(record_id, None)
+
+def flush_updates(table):
+    """Send a table's pending updates now; returns once they (and any in-flight flush) are written"""
+    if not WRITE_BEHIND_SECONDS:
+        return
+    with get_flush_lock(table):
+        with pending_lock:
+            updates = pending_updates.pop(table, {})
+        if not updates:
+            return
+        records = [{"id": record_id, "fields": fields} for record_id, fields in updates.items()]
+
+        def send(batch, unsent):
+            # On an upstream failure everything not yet written goes back in the queue
+            try:
+                response = airtable_request("PATCH", table, json={"records": batch})
+            except UpstreamUnavailableError as e:
+                requeue_updates(table, unsent, e.retry_after)
+                raise
+            if response.status_code == 429 or response.status_code >= 500:
+                requeue_updates(table, unsent)
+                raise UpstreamUnavailableError(table, f"HTTP {response.status_code}")
+            apply_write(table, response)
+            return response
+
+        written = 0
+        for i, batch in enumerate(batches(records)):
+            response = send(batch, records[i * 10:])
+            if response.status_code == 200:
+                written += len(batch)
+                continue
+            # Airtable rejects the whole batch for one invalid record, so resend one by one and drop only that
+            for j, record in enumerate(batch):
+                response = send([record], batch[j:] + records[(i + 1) * 10:]) if len(batch) > 1 else response
+                if response.status_code == 200:
+                    written += 1
+                else:
+                    print(f"❌ Write-behind {table}: dropped update to {record['id']}, "
+                          f"HTTP {response.status_code} {response.text}")
+        print(f"✅ Flushed {written} of {len(records)} coalesced {table} updates")
+
+def requeue_updates(table, records, retry_after=None):
+    """Put unsent updates back, under any fields written since they were taken"""
+    with pending_lock:
+        pending = pending_updates.setdefault(table, {})
+        for record in records:
+            pending[record["id"]] = dict(record["fields"], **pending.get(record["id"], {}))
+        schedule_flush_locked(table, max(WRITE_BEHIND_SECONDS, retry_after or 0))
+
+def flush_before_read(table):
+    """Make pending updates visible to a read; on an upstream failure the read proceeds without them"""
+    try:
+        flush_updates(table)
+    except UpstreamUnavailableError as e:
+        print(f"⚠️ Reading {table} without pending updates: {str(e)}")
+
+def flush_all_updates():
+    for table in list(pending_updates):
+        try:
+            flush_updates(table)
+        except Exception as e:
+            print(f"❌ Write-behind {table} flush error: {str(e)}")
+
+def update_record(table, record_id, fields):
+    """PATCH one record, or queue it when write-behind is enabled for the table"""
+    if WRITE_BEHIND_SECONDS and table in WRITE_BEHIND_TABLES:
+        merged = queue_update(table, record_id, fields)
+        return 202, {"records": [{"id": record_id, "fields": merged}], "queued": True}
+    response = airtable_request("PATCH", table, json={"records": [{"id": record_id, "fields": fields}]})
+    apply_write(table, response)
+    return response.status_code, response.json()
+
 # UPDATE operations
 @app.put("/sprints/{record_id}")
 async def update_sprint(record_id: str, request: Request):
     """Update sprint record"""
     try:
         data = await request.json()
-        payload = {"records": [{"id": record_id, "fields": data}]}
-        response = requests.patch(f"{BASE_URL}/Sprints", headers=headers, json=payload)
-        print(f"✅ Updated Sprint {record_id}: {response.status_code}")
-        return {"status": response.status_code, "data": response.json()}
+        status, result = await asyncio.to_thread(update_record, "Sprints", record_id, data)
+        print(f"✅ Updated Sprint {record_id}: {status}")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Update Sprint error: {str(e)}")
         return {"error": str(e)}
@@ -291,10 +1956,11 @@ async def update_cell(record_id: str, request: Request):
     """Update cell record"""
     try:
         data = await request.json()
-        payload = {"records": [{"id": record_id, "fields": data}]}
-        response = requests.patch(f"{BASE_URL}/Cells", headers=headers, json=payload)
-        print(f"✅ Updated Cell {record_id}: {response.status_code}")
-        return {"status": response.status_code, "data": response.json()}
+        status, result = await asyncio.to_thread(update_record, "Cells", record_id, data)
+        print(f"✅ Updated Cell {record_id}: {status}")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Update Cell error: {str(e)}")
         return {"error": str(e)}
@@ -304,10 +1970,11 @@ async def update_proof(record_id: str, request: Request):
     """Update proof record"""
     try:
         data = await request.json()
-        payload = {"records": [{"id": record_id, "fields": data}]}
-        response = requests.patch(f"{BASE_URL}/Proof", headers=headers, json=payload)
-        print(f"✅ Updated Proof {record_id}: {response.status_code}")
-        return {"status": response.status_code, "data": response.json()}
+        status, result = await asyncio.to_thread(update_record, "Proof", record_id, data)
+        print(f"✅ Updated Proof {record_id}: {status}")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Update Proof error: {str(e)}")
         return {"error": str(e)}
@@ -317,10 +1984,11 @@ async def update_heartbeat(record_id: str, request: Request):
     """Update heartbeat record"""
     try:
         data = await request.json()
-        payload = {"records": [{"id": record_id, "fields": data}]}
-        response = requests.patch(f"{BASE_URL}/Heartbeats", headers=headers, json=payload)
-        print(f"✅ Updated Heartbeat {record_id}: {response.status_code}")
-        return {"status": response.status_code, "data": response.json()}
+        status, result = await asyncio.to_thread(update_record, "Heartbeats", record_id, data)
+        print(f"✅ Updated Heartbeat {record_id}: {status}")
+        return {"status": status, "data": result}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Update Heartbeat error: {str(e)}")
         return {"error": str(e)}
@@ -330,9 +1998,16 @@ async def update_heartbeat(record_id: str, request: Request):
 def delete_sprint(record_id: str):
     """Delete sprint record"""
     try:
-        response = requests.delete(f"{BASE_URL}/Sprints/{record_id}", headers=headers)
+        discard_pending_updates("Sprints", [record_id])
+        response = airtable_request("DELETE", "Sprints", record_id)
+        invalidate_table("Sprints")
+        if response.status_code == 200:
+            unindex_records("Sprints", [record_id])
+            uncount_records([record_id])
         print(f"✅ Deleted Sprint {record_id}: {response.status_code}")
         return {"status": response.status_code, "message": "Sprint deleted"}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Delete Sprint error: {str(e)}")
         return {"error": str(e)}
@@ -341,9 +2016,15 @@ def delete_sprint(record_id: str):
 def delete_cell(record_id: str):
     """Delete cell record"""
     try:
-        response = requests.delete(f"{BASE_URL}/Cells/{record_id}", headers=headers)
+        discard_pending_updates("Cells", [record_id])
+        response = airtable_request("DELETE", "Cells", record_id)
+        invalidate_table("Cells")
+        if response.status_code == 200:
+            unindex_records("Cells", [record_id])
         print(f"✅ Deleted Cell {record_id}: {response.status_code}")
         return {"status": response.status_code, "message": "Cell deleted"}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Delete Cell error: {str(e)}")
         return {"error": str(e)}
@@ -352,9 +2033,16 @@ def delete_cell(record_id: str):
 def delete_proof(record_id: str):
     """Delete proof record"""
     try:
-        response = requests.delete(f"{BASE_URL}/Proof/{record_id}", headers=headers)
+        discard_pending_updates("Proof", [record_id])
+        response = airtable_request("DELETE", "Proof", record_id)
+        invalidate_table("Proof")
+        if response.status_code == 200:
+            unindex_records("Proof", [record_id])
+            uncount_records([record_id])
         print(f"✅ Deleted Proof {record_id}: {response.status_code}")
         return {"status": response.status_code, "message": "Proof deleted"}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Delete Proof error: {str(e)}")
         return {"error": str(e)}
@@ -363,13 +2051,428 @@ def delete_proof(record_id: str):
 def delete_heartbeat(record_id: str):
     """Delete heartbeat record"""
     try:
-        response = requests.delete(f"{BASE_URL}/Heartbeats/{record_id}", headers=headers)
+        discard_pending_updates("Heartbeats", [record_id])
+        response = airtable_request("DELETE", "Heartbeats", record_id)
+        invalidate_table("Heartbeats")
+        if response.status_code == 200:
+            unindex_records("Heartbeats", [record_id])
+            uncount_records([record_id])
         print(f"✅ Deleted Heartbeat {record_id}: {response.status_code}")
         return {"status": response.status_code, "message": "Heartbeat deleted"}
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Delete Heartbeat error: {str(e)}")
         return {"error": str(e)}
 
+# Bulk export
+EXPORT_TABLES = ["Sprints", "Cells", "Proof", "Heartbeats", "Daily_Digest"]
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow")
+}
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/exports")
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back in chunks"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def flatten_record(record, fields):
+    """Turn an Airtable record into a flat row; lists and objects become JSON strings"""
+    row = {"id": record.get("id"), "createdTime": record.get("createdTime")}
+    values = record.get("fields", {})
+    for field in fields:
+        value = values.get(field)
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value, separators=(",", ":"))
+        row[field] = value
+    return row
+
+def iter_export_chunks(pages):
+    """Group pages of records into lists of roughly EXPORT_CHUNK_ROWS records"""
+    chunk = []
+    for records in pages:
+        chunk.extend(records)
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Airtable field types exported as float64 / bool columns; everything else is a string
+NUMBER_FIELD_TYPES = {"number", "percent", "currency", "rating", "duration", "count", "autoNumber"}
+table_schemas = {}  # table -> (fetched_at, [(field name, Airtable type)])
+
+def field_type(field):
+    if field["type"] in ("formula", "rollup"):
+        return field.get("options", {}).get("result", {}).get("type", field["type"])
+    return field["type"]
+
+def table_fields(table):
+    """Field names and types from the metadata API, or None when the token cannot read the schema"""
+    cached = table_schemas.get(table)
+    if cached and time.time() - cached[0] < CACHE_TTL_SECONDS:
+        return cached[1]
+    base = bases[0]  # sharded tables have the same schema in every base
+    with span("airtable GET meta", kind="client", table=table, method="GET"):
+        base.rate.acquire()
+        try:
+            response = base.session.get(f"https://api.airtable.com/v0/meta/bases/{base.base_id}/tables",
+                                        headers=base.headers, timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+        except requests.RequestException as e:
+            print(f"⚠️ Could not read the {table} schema: {type(e).__name__}")
+            return None
+    if response.status_code != 200:
+        print(f"⚠️ Could not read the {table} schema: HTTP {response.status_code}")
+        return None
+    for entry in response.json().get("tables", []):
+        table_schemas[entry["name"]] = (time.time(), [(f["name"], field_type(f)) for f in entry.get("fields", [])])
+    return table_schemas.get(table, (0, None))[1]
+
+def arrow_schema(rows, columns, types=None):
+    """Arrow schema from the Airtable field types, or inferred from the first chunk when they are unknown"""
+    arrow_types = {}
+    for column in columns:
+        if types is not None:
+            kind = types.get(column)
+            arrow_types[column] = (pyarrow.float64() if kind in NUMBER_FIELD_TYPES
+                                   else pyarrow.bool_() if kind == "checkbox" else pyarrow.string())
+            continue
+        sample = next((row[column] for row in rows if row.get(column) is not None), None)
+        if isinstance(sample, bool):
+            arrow_types[column] = pyarrow.bool_()
+        elif isinstance(sample, (int, float)):
+            arrow_types[column] = pyarrow.float64()
+        else:
+            arrow_types[column] = pyarrow.string()
+    return pyarrow.schema([(column, arrow_types[column]) for column in columns])
+
+def arrow_batch(rows, schema):
+    columns = {}
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pyarrow.types.is_string(field.type):
+            values = [None if v is None else str(v) for v in values]
+        elif pyarrow.types.is_floating(field.type):
+            bad = [v for v in values if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)))]
+        else:
+            bad = [v for v in values if v is not None and not isinstance(v, bool)]
+        if not pyarrow.types.is_string(field.type) and bad:
+            # Nulling the value would silently lose data
+            raise ValueError(f"Field {field.name} is {field.type} but has the value {bad[0]!r}; "
+                             "export it as csv or ndjson")
+        columns[field.name] = pyarrow.array(values, type=field.type)
+    return pyarrow.RecordBatch.from_pydict(columns, schema=schema)
+
+def export_stream(fmt, first_chunk, chunks, fields, types=None):
+    """Encode chunks of records as bytes in the requested format, one chunk at a time.
+
+    fields fixes the columns; NDJSON without fields writes every field each record has.
+    """
+    columns = ["id", "createdTime"] + (fields or [])
+    data_fields = columns[2:]
+    all_chunks = itertools.chain([first_chunk] if first_chunk else [], chunks)
+
+    if fmt == "ndjson":
+        for chunk in all_chunks:
+            yield "".join(json.dumps(flatten_record(r, data_fields or list(r.get("fields", {})))) + "\n"
+                          for r in chunk).encode()
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for chunk in all_chunks:
+            writer.writerows(flatten_record(r, data_fields) for r in chunk)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    else:
+        sink = ChunkSink()
+        schema = arrow_schema([flatten_record(r, data_fields) for r in first_chunk], columns, types)
+        if fmt == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+        else:
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        for chunk in all_chunks:
+            writer.write_batch(arrow_batch([flatten_record(r, data_fields) for r in chunk], schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+@app.get("/export/{table}")
+def export_table(table: str, format: str = "csv", fields: str = None, since: str = None,
+                 until: str = None, destination: str = "stream"):
+    """Export a full table as CSV, NDJSON, Parquet or Arrow, paging through Airtable in chunks"""
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if format in ("parquet", "arrow") and pyarrow is None:
+        raise HTTPException(status_code=501, detail="Install pyarrow to export Parquet or Arrow")
+    if destination not in ("stream", "file"):
+        raise HTTPException(status_code=400, detail="destination must be 'stream' or 'file'")
+
+    params = []
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    for field in field_list or []:
+        params.append(("fields[]", field))
+    # Date range on the record creation time, validated before it goes into the formula
+    conditions = []
+    try:
+        if since:
+            conditions.append(f"NOT(IS_BEFORE(CREATED_TIME(), '{datetime.fromisoformat(since).isoformat()}'))")
+        if until:
+            conditions.append(f"IS_BEFORE(CREATED_TIME(), '{datetime.fromisoformat(until).isoformat()}')")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be ISO dates")
+    if conditions:
+        params.append(("filterByFormula", f"AND({', '.join(conditions)})"))
+
+    # Columns and types come from the table schema, since Airtable leaves empty fields out of records
+    schema_fields = table_fields(table)
+    types = dict(schema_fields) if schema_fields is not None else None
+    if field_list is None and schema_fields is not None:
+        field_list = [name for name, _ in schema_fields]
+    if field_list is None and format != "ndjson":
+        raise HTTPException(status_code=400, detail=f"Pass fields= for {format} exports; the {table} schema "
+                                                    "could not be read (the token needs schema.bases:read)")
+
+    # Read the first chunk up front so upstream errors surface as a proper status code
+    chunks = iter_export_chunks(iter_table_pages(table, params))
+    try:
+        first_chunk = next(chunks, [])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    stream = export_stream(format, first_chunk, chunks, field_list, types)
+    filename = f"{table}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+
+    if destination == "file":
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, filename)
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                for data in stream:
+                    f.write(data)
+                    size += len(data)
+        except ValueError as e:
+            os.remove(path)
+            raise HTTPException(status_code=422, detail=str(e))
+        print(f"📤 Exported {table} to {path}: {size} bytes")
+        return {"status": "written", "path": path, "bytes": size}
+
+    print(f"📤 Streaming {table} export as {format}")
+    return StreamingResponse(stream, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Heartbeat retention and hourly roll-ups
+HOURLY_TABLE = "Heartbeats_Hourly"
+HEARTBEAT_RETENTION_HOURS = float(os.getenv("HEARTBEAT_RETENTION_HOURS", "48"))
+HEARTBEAT_COMPACTION_CRON = os.getenv("HEARTBEAT_COMPACTION_CRON", "15 * * * *")
+COMPACTION_DELETE_WORKERS = int(os.getenv("COMPACTION_DELETE_WORKERS", "4"))
+COMPACTION_JOURNAL_PATH = os.getenv("COMPACTION_JOURNAL_PATH", "data/compaction_journal.json")
+
+def batches(items, size=10):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def delete_records(table, record_ids, workers=COMPACTION_DELETE_WORKERS, missing_ok=False, on_batch=None):
+    """Delete records in 10-record batches, several batches in parallel.
+
+    With missing_ok, ids Airtable no longer has count as already deleted. on_batch(batch) runs after each batch.
+    """
+    def delete_batch(batch):
+        response = airtable_request("DELETE", table, params=[("records[]", rid) for rid in batch])
+        if response.status_code == 404 and missing_ok:
+            # One missing id fails the whole batch, so retry its ids one at a time
+            if len(batch) > 1:
+                return sum(delete_batch([rid]) for rid in batch)
+            deleted = 0
+        elif response.status_code != 200:
+            raise ValueError(f"Delete from {table} failed: HTTP {response.status_code}")
+        else:
+            deleted = len(batch)
+        if on_batch:
+            on_batch(batch)
+        return deleted
+
+    discard_pending_updates(table, record_ids)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        deleted = sum(pool.map(delete_batch, batches(record_ids)))
+    invalidate_table(table)
+    unindex_records(table, record_ids)
+    return deleted
+
+def upsert_hourly_buckets(buckets):
+    for batch in batches(buckets):
+        payload = {"performUpsert": {"fieldsToMergeOn": ["Bucket"]}, "typecast": True,
+                   "records": [{"fields": fields} for fields in batch]}
+        response = airtable_request("PATCH", HOURLY_TABLE, json=payload)
+        if response.status_code != 200:
+            raise ValueError(f"Upsert into {HOURLY_TABLE} failed: HTTP {response.status_code} {response.text}")
+    global hourly_table_available
+    hourly_table_available = True
+    invalidate_table(HOURLY_TABLE)
+
+def new_bucket(cell_id, hour):
+    return {"cell_id": cell_id, "hour": hour, "count": 0, "last_seen": "",
+            "cpu_sum": 0.0, "cpu_n": 0, "cpu_max": None, "ram_sum": 0.0, "ram_n": 0, "ram_max": None}
+
+def add_to_bucket(bucket, value, prefix):
+    if value:
+        bucket[f"{prefix}_sum"] += value
+        bucket[f"{prefix}_n"] += 1
+        bucket[f"{prefix}_max"] = value if bucket[f"{prefix}_max"] is None else max(bucket[f"{prefix}_max"], value)
+
+def bucket_fields(key, bucket):
+    fields = {"Bucket": key, "Cell_ID": bucket["cell_id"], "Hour": f"{bucket['hour']}:00:00.000Z",
+              "Sample_Count": bucket["count"], "Last_Seen": bucket["last_seen"],
+              "CPU_Samples": bucket["cpu_n"], "RAM_Samples": bucket["ram_n"]}
+    for prefix, name in (("cpu", "CPU"), ("ram", "RAM")):
+        if bucket[f"{prefix}_n"]:
+            fields[f"{name}_Avg"] = round(bucket[f"{prefix}_sum"] / bucket[f"{prefix}_n"], 2)
+            fields[f"{name}_Max"] = bucket[f"{prefix}_max"]
+    return fields
+
+def finish_compaction_journal():
+    """Complete a compaction interrupted after its roll-ups were computed.
+
+    Deleted batches are appended to a progress file next to the journal, so a resumed run only deletes
+    the rest; ids already gone from Airtable are treated as deleted.
+    """
+    if not os.path.exists(COMPACTION_JOURNAL_PATH):
+        return
+    with open(COMPACTION_JOURNAL_PATH) as f:
+        journal = json.load(f)
+    progress_path = f"{COMPACTION_JOURNAL_PATH}.deleted"
+    done = set()
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            for line in f:
+                try:
+                    done.update(json.loads(line))
+                except ValueError:
+                    break  # last line cut short by a crash
+    record_ids = [rid for rid in journal["record_ids"] if rid not in done]
+    print(f"⏪ Resuming compaction: {len(journal['buckets'])} buckets, {len(record_ids)} heartbeats")
+    # Buckets hold absolute values, so upserting them again is idempotent
+    upsert_hourly_buckets(journal["buckets"])
+    progress_lock = threading.Lock()
+    with open(progress_path, "a") as progress:
+        def record_progress(batch):
+            with progress_lock:
+                progress.write(json.dumps(batch) + "\n")
+                progress.flush()
+        delete_records("Heartbeats", record_ids, missing_ok=True, on_batch=record_progress)
+    os.remove(COMPACTION_JOURNAL_PATH)
+    os.remove(progress_path)
+
+def compact_heartbeats():
+    """Roll raw heartbeats older than the retention window into hourly per-cell buckets"""
+    finish_compaction_journal()
+    cutoff = (datetime.utcnow() - timedelta(hours=HEARTBEAT_RETENTION_HOURS)).replace(minute=0, second=0, microsecond=0)
+    cutoff_iso = cutoff.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    buckets = {}
+    record_ids = []
+    old_heartbeats = iter_table_pages("Heartbeats", [("filterByFormula", f"IS_BEFORE(CREATED_TIME(), '{cutoff_iso}')")])
+    for records in old_heartbeats:
+        for record in records:
+            fields = record.get("fields", {})
+            hour = record.get("createdTime", "")[:13]
+            cell_id = fields.get("Cell_ID", "Unknown")
+            key = f"{cell_id}|{hour}"
+            bucket = buckets.setdefault(key, new_bucket(cell_id, hour))
+            bucket["count"] += 1
+            bucket["last_seen"] = max(bucket["last_seen"], record.get("createdTime", ""))
+            add_to_bucket(bucket, fields.get("CPU_Usage"), "cpu")
+            add_to_bucket(bucket, fields.get("RAM_Usage"), "ram")
+            record_ids.append(record["id"])
+    if not record_ids:
+        print("🗜️ No heartbeats to compact")
+        return {"compacted": 0, "buckets": 0}
+
+    # Merge with buckets written by earlier runs (late heartbeats for an already compacted hour)
+    first_hour = min(bucket["hour"] for bucket in buckets.values())
+    existing_rows = iter_table_pages(HOURLY_TABLE, [("filterByFormula", f"NOT(IS_BEFORE({{Hour}}, '{first_hour}:00:00.000Z'))")])
+    for records in existing_rows:
+        for record in records:
+            fields = record.get("fields", {})
+            bucket = buckets.get(fields.get("Bucket"))
+            if bucket is None:
+                continue
+            bucket["count"] += fields.get("Sample_Count", 0)
+            bucket["last_seen"] = max(bucket["last_seen"], fields.get("Last_Seen", ""))
+            for prefix, name in (("cpu", "CPU"), ("ram", "RAM")):
+                samples = fields.get(f"{name}_Samples", 0)
+                if samples:
+                    bucket[f"{prefix}_sum"] += fields.get(f"{name}_Avg", 0) * samples
+                    bucket[f"{prefix}_n"] += samples
+                    previous_max = fields.get(f"{name}_Max", 0)
+                    bucket[f"{prefix}_max"] = previous_max if bucket[f"{prefix}_max"] is None else max(bucket[f"{prefix}_max"], previous_max)
+
+    # Journal first, so a crash between roll-up and delete never double counts
+    journal = {"buckets": [bucket_fields(key, bucket) for key, bucket in buckets.items()], "record_ids": record_ids}
+    os.makedirs(os.path.dirname(COMPACTION_JOURNAL_PATH) or ".", exist_ok=True)
+    if os.path.exists(f"{COMPACTION_JOURNAL_PATH}.deleted"):
+        os.remove(f"{COMPACTION_JOURNAL_PATH}.deleted")  # left over from a run that crashed while cleaning up
+    with open(COMPACTION_JOURNAL_PATH, "w") as f:
+        json.dump(journal, f)
+    finish_compaction_journal()
+
+    print(f"🗜️ Compacted {len(record_ids)} heartbeats into {len(buckets)} hourly buckets")
+    return {"compacted": len(record_ids), "buckets": len(buckets), "cutoff": cutoff_iso}
+
+# Cleared when Airtable reports the roll-up table missing, so reads stop asking for it
+hourly_table_available = True
+
+def read_hourly_rollups():
+    """Cached hourly heartbeat buckets, or None when there are none to combine"""
+    global hourly_table_available
+    if not hourly_table_available:
+        return None
+    try:
+        data = read_table(HOURLY_TABLE)
+    except UpstreamUnavailableError:
+        return None
+    if "records" not in data:
+        hourly_table_available = False
+        return None
+    return data["records"]
+
+def hourly_rollups_for_day(day):
+    """Hourly heartbeat buckets for a YYYY-MM-DD day; empty if the roll-up table does not exist"""
+    try:
+        formula = f"IS_SAME({{Hour}}, '{day}', 'day')"
+        return [r for records in iter_table_pages(HOURLY_TABLE, [("filterByFormula", formula)]) for r in records]
+    except ValueError:
+        return []
+
 @app.post("/daily-digest")
 def generate_daily_digest():
     """Generate daily digest summary"""
@@ -378,69 +2481,75 @@ def generate_daily_digest():
         today = datetime.now().strftime("%Y-%m-%d")
         
         # Get data from all tables
-        sprints_response = requests.get(f"{BASE_URL}/Sprints", headers=headers)
-        cells_response = requests.get(f"{BASE_URL}/Cells", headers=headers)
-        proof_response = requests.get(f"{BASE_URL}/Proof", headers=headers)
-        heartbeats_response = requests.get(f"{BASE_URL}/Heartbeats", headers=headers)
+        with span("digest.load"):
+            sprints = read_table("Sprints").get('records', [])
+            cells = read_table("Cells").get('records', [])
+            proofs = read_table("Proof").get('records', [])
+            heartbeats = read_table("Heartbeats").get('records', [])
+            rollups_today = hourly_rollups_for_day(today)
         
-        sprints = sprints_response.json().get('records', [])
-        cells = cells_response.json().get('records', [])
-        proofs = proof_response.json().get('records', [])
-        heartbeats = heartbeats_response.json().get('records', [])
-        
-        # Filter records by today's date
-        sprints_today = [s for s in sprints if s.get('createdTime', '').startswith(today)]
-        proofs_today = [p for p in proofs if p.get('createdTime', '').startswith(today)]
-        heartbeats_today = [h for h in heartbeats if h.get('createdTime', '').startswith(today)]
-        
-        # Calculate daily metrics
-        total_droplets = len(cells)  # Current total cells
-        active_droplets = len([c for c in cells if c.get('fields', {}).get('Health_Status') == 'OK'])
-        uptime_percentage = (active_droplets / total_droplets * 100) if total_droplets > 0 else 0
-        offline_cells = total_droplets - active_droplets
-        
-        # Sprint activity - current status of all sprints + daily activity
-        new_sprints_today = len(sprints_today)  # New sprints created today
-        
-        # Current sprint status (all sprints)
-        all_completed_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Done'])
-        all_active_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Active'])
-        all_pending_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Pending'])
-        total_sprints = len(sprints)  # Total sprints in system
-        
-        # For daily digest, focus on current status
-        completed_sprints = all_completed_sprints
-        in_progress_sprints = all_active_sprints + all_pending_sprints
-        
-        # Daily proof activity
-        total_proofs = len(proofs_today)  # Proofs submitted today
-        verified_proofs = len([p for p in proofs_today if 'passed' in str(p.get('fields', {}).get('Result', '')).lower()])
-        failed_proofs = len([p for p in proofs_today if 'failed' in str(p.get('fields', {}).get('Result', '')).lower()])
-        pending_proofs = total_proofs - verified_proofs - failed_proofs
-        
-        # Calculate heartbeat averages from today only
-        cpu_values = [h.get('fields', {}).get('CPU_Usage', 0) for h in heartbeats_today if h.get('fields', {}).get('CPU_Usage')]
-        ram_values = [h.get('fields', {}).get('RAM_Usage', 0) for h in heartbeats_today if h.get('fields', {}).get('RAM_Usage')]
-        
-        average_cpu = sum(cpu_values) / len(cpu_values) if cpu_values else 0
-        average_ram = sum(ram_values) / len(ram_values) if ram_values else 0
-        
-        # Get last ping time from today's heartbeats
-        last_ping_time = ""
-        if heartbeats_today:
-            timestamps = [h.get('createdTime', '') for h in heartbeats_today]
-            last_ping_time = max(timestamps) if timestamps else ""
-        elif heartbeats:  # Fallback to latest heartbeat if none today
-            timestamps = [h.get('createdTime', '') for h in heartbeats]
-            last_ping_time = max(timestamps) if timestamps else ""
-        
-        # Generate warnings and daily summary
-        offline_cell_ids = [c.get('fields', {}).get('Cell_ID', 'Unknown') for c in cells 
-                           if c.get('fields', {}).get('Health_Status') != 'OK']
-        warnings = f"Offline cells: {', '.join(offline_cell_ids)}" if offline_cell_ids else "All systems operational"
-        
-        # Daily activity summary
-        daily_summary = f"Today: {new_sprints_today} new sprints, {total_proofs} proofs submitted, {len(heartbeats_today)} heartbeats. Current: {completed_sprints} completed sprints, {all_active_sprints} active, {all_pending_sprints} pending."
+        with span("digest.aggregate"):
+            # Filter records by today's date
+            sprints_today = [s for s in sprints if s.get('createdTime', '').startswith(today)]
+            proofs_today = [p for p in proofs if p.get('createdTime', '').startswith(today)]
+            heartbeats_today = [h for h in heartbeats if h.get('createdTime', '').startswith(today)]
+
+            # Calculate daily metrics
+            total_droplets = len(cells)  # Current total cells
+            active_droplets = len([c for c in cells if c.get('fields', {}).get('Health_Status') == 'OK'])
+            uptime_percentage = (active_droplets / total_droplets * 100) if total_droplets > 0 else 0
+            offline_cells = total_droplets - active_droplets
+
+            # Sprint activity - current status of all sprints + daily activity
+            new_sprints_today = len(sprints_today)  # New sprints created today
+
+            # Current sprint status (all sprints)
+            all_completed_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Done'])
+            all_active_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Active'])
+            all_pending_sprints = len([s for s in sprints if s.get('fields', {}).get('Status') == 'Pending'])
+            total_sprints = len(sprints)  # Total sprints in system
+
+            # For daily digest, focus on current status
+            completed_sprints = all_completed_sprints
+            in_progress_sprints = all_active_sprints + all_pending_sprints
+
+            # Daily proof activity
+            total_proofs = len(proofs_today)  # Proofs submitted today
+            verified_proofs = len([p for p in proofs_today if 'passed' in str(p.get('fields', {}).get('Result', '')).lower()])
+            failed_proofs = len([p for p in proofs_today if 'failed' in str(p.get('fields', {}).get('Result', '')).lower()])
+            pending_proofs = total_proofs - verified_proofs - failed_proofs
+
+            # Calculate heartbeat averages from today only
+            cpu_values = [h.get('fields', {}).get('CPU_Usage', 0) for h in heartbeats_today if h.get('fields', {}).get('CPU_Usage')]
+            ram_values = [h.get('fields', {}).get('RAM_Usage', 0) for h in heartbeats_today if h.get('fields', {}).get('RAM_Usage')]
+
+            # Compacted hours of today count with their sample weights
+            rollup_fields = [r.get('fields', {}) for r in rollups_today]
+            heartbeat_count_today = len(heartbeats_today) + sum(f.get('Sample_Count', 0) for f in rollup_fields)
+            cpu_total = sum(cpu_values) + sum(f.get('CPU_Avg', 0) * f.get('CPU_Samples', 0) for f in rollup_fields)
+            cpu_count = len(cpu_values) + sum(f.get('CPU_Samples', 0) for f in rollup_fields)
+            ram_total = sum(ram_values) + sum(f.get('RAM_Avg', 0) * f.get('RAM_Samples', 0) for f in rollup_fields)
+            ram_count = len(ram_values) + sum(f.get('RAM_Samples', 0) for f in rollup_fields)
+
+            average_cpu = cpu_total / cpu_count if cpu_count else 0
+            average_ram = ram_total / ram_count if ram_count else 0
+
+            # Get last ping time from today's heartbeats
+            last_ping_time = ""
+            if heartbeats_today or rollup_fields:
+                timestamps = [h.get('createdTime', '') for h in heartbeats_today] + [f.get('Last_Seen', '') for f in rollup_fields]
+                last_ping_time = max(timestamps) if timestamps else ""
+            elif heartbeats:  # Fallback to latest heartbeat if none today
+                timestamps = [h.get('createdTime', '') for h in heartbeats]
+                last_ping_time = max(timestamps) if timestamps else ""
+
+            # Generate warnings and daily summary
+            offline_cell_ids = [c.get('fields', {}).get('Cell_ID', 'Unknown') for c in cells 
+                               if c.get('fields', {}).get('Health_Status') != 'OK']
+            warnings = f"Offline cells: {', '.join(offline_cell_ids)}" if offline_cell_ids else "All systems operational"
+
+            # Daily activity summary
+            daily_summary = f"Today: {new_sprints_today} new sprints, {total_proofs} proofs submitted, {heartbeat_count_today} heartbeats. Current: {completed_sprints} completed sprints, {all_active_sprints} active, {all_pending_sprints} pending."
         
         # Create digest record
         digest_data = {
@@ -472,7 +2581,7 @@ def generate_daily_digest():
         }
         
         # Save to Daily_Digest table
-        response = requests.post(f"{BASE_URL}/Daily_Digest", headers=headers, json=digest_data)
+        response = airtable_request("POST", "Daily_Digest", json=digest_data)
         print(f"📊 Daily digest generated: {response.status_code}")
         
         return {
@@ -491,52 +2600,503 @@ def generate_daily_digest():
                 "pending_sprints": all_pending_sprints,
                 "proofs_submitted_today": total_proofs,
                 "proofs_verified_today": verified_proofs,
-                "heartbeats_today": len(heartbeats_today)
+                "heartbeats_today": heartbeat_count_today
             }
         }
         
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"❌ Daily digest error: {str(e)}")
         return {"error": str(e)}
 
-# Automatic daily digest scheduler
-import threading
-import time
-from datetime import datetime, time as dt_time
+# Incremental daily digest counters, fed by this server's writes and webhooks
+DIGEST_COUNTER_DAYS = int(os.getenv("DIGEST_COUNTER_DAYS", "7"))
+DIGEST_RECONCILE_CRON = os.getenv("DIGEST_RECONCILE_CRON", "*/30 * * * *")
+DIGEST_TRACKED_RECORDS = int(os.getenv("DIGEST_TRACKED_RECORDS", "20000"))
+DIGEST_COUNTER_TABLES = ("Sprints", "Proof", "Heartbeats")
+
+digest_days = {}  # YYYY-MM-DD (UTC creation day) -> counter -> value, plus "last_ping"
+# Most recently counted records only: digest key -> [table, day, contribution, createdTime, record id or None]
+digest_records = collections.OrderedDict()
+digest_keys = {}  # record id -> digest key, where the two differ
+digest_forgotten_before = ""  # newest createdTime dropped from digest_records
+digest_touched = None  # key -> entry (None when removed), collected while a reconcile runs
+digest_reconciled = {}  # day -> time of its last reconcile
+webhook_event_ids = itertools.count(1)
+digest_lock = threading.Lock()
+
+def record_contribution(table, fields):
+    """What one record adds to its day's counters, with the same rules as the full digest"""
+    if table == "Sprints":
+        return {"new_sprints": 1}
+    if table == "Proof":
+        result = str(fields.get("Result", "")).lower()
+        return {"proofs": 1, "proofs_passed": int("passed" in result), "proofs_failed": int("failed" in result)}
+    cpu, ram = fields.get("CPU_Usage"), fields.get("RAM_Usage")
+    return {"heartbeats": 1, "cpu_sum": cpu or 0, "cpu_count": int(bool(cpu)),
+            "ram_sum": ram or 0, "ram_count": int(bool(ram))}
+
+def add_contribution_locked(day, contribution, sign, last_ping=None):
+    counters = digest_days.setdefault(day, {})
+    for name, value in contribution.items():
+        counters[name] = counters.get(name, 0) + sign * value
+    if last_ping and last_ping > counters.get("last_ping", ""):
+        counters["last_ping"] = last_ping
+
+def digest_key(table, fields, record_id=None):
+    """Proofs count once per Proof_ID and heartbeats once per Cell_ID and Timestamp, via the API or a webhook"""
+    if table == "Proof" and fields.get("Proof_ID"):
+        return f"Proof:{fields['Proof_ID']}"
+    if table == "Heartbeats" and fields.get("Cell_ID") and fields.get("Timestamp"):
+        return f"Heartbeats:{fields['Cell_ID']}:{fields['Timestamp']}"
+    return record_id
+
+def pop_entry_locked(key):
+    entry = digest_records.pop(key, None)
+    if entry is not None and entry[4]:
+        digest_keys.pop(entry[4], None)
+    return entry
+
+def set_contribution_locked(key, entry):
+    """Replace what a record contributes; a deleted record's heartbeat keeps last_ping until reconciled"""
+    old = pop_entry_locked(key)
+    if old is not None:
+        add_contribution_locked(old[1], old[2], -1)
+    if entry is not None:
+        digest_records[key] = entry
+        if entry[4] and entry[4] != key:
+            digest_keys[entry[4]] = key
+        add_contribution_locked(entry[1], entry[2], 1, entry[3] if entry[0] == "Heartbeats" else None)
+    if digest_touched is not None:
+        digest_touched[key] = entry
+    forget_contributions_locked()
+
+def forget_contributions_locked():
+    """Keep the per-day totals but only the newest DIGEST_TRACKED_RECORDS per-record entries"""
+    global digest_forgotten_before
+    while len(digest_records) > DIGEST_TRACKED_RECORDS:
+        entry = pop_entry_locked(next(iter(digest_records)))
+        digest_forgotten_before = max(digest_forgotten_before, entry[3])
+
+def left_to_reconcile_locked(keys, entry):
+    """Whether a record without an entry is better left to the reconcile than added as new.
+
+    That is an update to a record whose entry was dropped (it is already in the totals), or to one created
+    before the counters started: only today, and yesterday once it has counters, take new records live.
+    """
+    if any(key in digest_records for key in keys):
+        return False
+    today = datetime.utcnow().date()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    if entry[1] != today.isoformat() and not (entry[1] == yesterday and yesterday in digest_days):
+        return True
+    return entry[3] < digest_forgotten_before
+
+def record_entry(table, record):
+    created = record.get("createdTime", "")
+    return [table, created[:10], record_contribution(table, record.get("fields", {})), created, record["id"]]
+
+def count_records(table, records):
+    """Add created records, or replace the contribution of updated ones"""
+    if table not in DIGEST_COUNTER_TABLES:
+        return
+    with digest_lock:
+        for record in records:
+            if "id" in record and record.get("createdTime"):
+                key = digest_key(table, record.get("fields", {}), record["id"])
+                previous = digest_keys.get(record["id"], record["id"])
+                entry = record_entry(table, record)
+                if left_to_reconcile_locked((key, previous), entry):
+                    continue
+                if previous != key and previous in digest_records:
+                    set_contribution_locked(previous, None)  # its Proof_ID or Timestamp changed
+                set_contribution_locked(key, entry)
+
+def uncount_records(record_ids):
+    with digest_lock:
+        for record_id in record_ids:
+            key = digest_keys.get(record_id, record_id)
+            if key in digest_records:
+                set_contribution_locked(key, None)
+
+def count_webhook_event(table, event):
+    """Count a webhook event unless the same proof or timestamped heartbeat is already counted.
 
-def daily_digest_scheduler():
-    """Run daily digest at 6 AM every day"""
+    Heartbeats without a Timestamp can't be matched to a record: they count until the next reconcile,
+    which replaces them with the heartbeat records actually in Airtable.
+    """
+    timestamp = str(event.get("Timestamp") or "")
+    if not (len(timestamp) >= 10 and timestamp[4] == "-" and timestamp[7] == "-"):
+        timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    key = digest_key(table, event) or f"webhook:Heartbeats:{event['Cell_ID']}:{next(webhook_event_ids)}"
+    entry = [table, timestamp[:10], record_contribution(table, event), timestamp, None]
+    with digest_lock:
+        existing = digest_records.get(key)
+        # Skip events for a record already counted from this server's own write
+        if (existing is None or existing[4] is None) and not left_to_reconcile_locked((key,), entry):
+            set_contribution_locked(key, entry)
+
+def rollup_contribution(fields):
+    return {"heartbeats": fields.get("Sample_Count", 0),
+            "cpu_sum": fields.get("CPU_Avg", 0) * fields.get("CPU_Samples", 0), "cpu_count": fields.get("CPU_Samples", 0),
+            "ram_sum": fields.get("RAM_Avg", 0) * fields.get("RAM_Samples", 0), "ram_count": fields.get("RAM_Samples", 0)}
+
+def reconcile_digest_counters():
+    """Recompute yesterday's and today's counters from Airtable and replace the running ones.
+
+    Writes that land while the tables are being read are replayed on top of the recomputed state.
+    """
+    global digest_touched
+    today = datetime.utcnow().date()
+    days = [(today - timedelta(days=1)).isoformat(), today.isoformat()]
+    with digest_lock:
+        digest_touched = {}
+    try:
+        formula = "OR(" + ", ".join(f"IS_SAME(CREATED_TIME(), '{day}', 'day')" for day in days) + ")"
+        fresh = {}
+        for table in DIGEST_COUNTER_TABLES:
+            for page in iter_table_pages(table, [("filterByFormula", formula)]):
+                for record in page:
+                    fresh[digest_key(table, record.get("fields", {}), record["id"])] = record_entry(table, record)
+        rollups = {day: hourly_rollups_for_day(day) for day in days}
+    except Exception:
+        with digest_lock:
+            digest_touched = None
+        raise
+
+    with digest_lock:
+        touched, digest_touched = digest_touched, None
+        for key, entry in touched.items():
+            if entry is None:
+                fresh.pop(key, None)
+            elif entry[1] in days:
+                fresh[key] = entry
+        before = {day: digest_days.get(day, {}) for day in days}
+        for key in [key for key, entry in digest_records.items() if entry[1] in days]:
+            pop_entry_locked(key)
+        for day in days:
+            digest_days[day] = {}
+        # Oldest first, so the newest records are the ones that stay tracked
+        for key, entry in sorted(fresh.items(), key=lambda item: item[1][3]):
+            if entry[1] in days:
+                set_contribution_locked(key, entry)
+        for day, records in rollups.items():
+            for record in records:
+                fields = record.get("fields", {})
+                add_contribution_locked(day, rollup_contribution(fields), 1, fields.get("Last_Seen"))
+        drift = {}
+        for day in days:
+            changes = {name: round(value - before[day].get(name, 0), 2) for name, value in digest_days[day].items()
+                       if name != "last_ping" and value != before[day].get(name, 0)}
+            if changes:
+                drift[day] = changes
+            digest_reconciled[day] = datetime.utcnow().isoformat()
+
+        # Forget days that are out of the window
+        oldest = (today - timedelta(days=DIGEST_COUNTER_DAYS - 1)).isoformat()
+        for day in [day for day in digest_days if day < oldest]:
+            del digest_days[day]
+            digest_reconciled.pop(day, None)
+        for key in [key for key, entry in digest_records.items() if entry[1] < oldest]:
+            pop_entry_locked(key)
+
+    print(f"🧮 Reconciled digest counters for {', '.join(days)}: {len(fresh)} records, drift {drift or 'none'}")
+    return {"days": days, "records": len(fresh), "drift": drift}
+
+def export_digest_counters():
+    with digest_lock:
+        return {"days": {day: dict(counters) for day, counters in digest_days.items()},
+                "records": list(digest_records.items()), "forgotten_before": digest_forgotten_before,
+                "reconciled": dict(digest_reconciled)}
+
+def restore_digest_counters(state):
+    global digest_forgotten_before
+    with digest_lock:
+        digest_days.update(state.get("days", {}))
+        # Saved oldest first, so a smaller DIGEST_TRACKED_RECORDS keeps the newest
+        for key, entry in state.get("records", []):
+            digest_records[key] = entry
+            if entry[4] and entry[4] != key:
+                digest_keys[entry[4]] = key
+        digest_forgotten_before = max(digest_forgotten_before, state.get("forgotten_before", ""))
+        forget_contributions_locked()
+        digest_reconciled.update(state.get("reconciled", {}))
+
+snapshot_sections["digest_counters"] = (export_digest_counters, restore_digest_counters, False)
+
+@app.get("/daily-digest/{date}")
+def get_daily_digest(date: str):
+    """Live digest counters for a UTC day (YYYY-MM-DD or "today"), without reading Airtable"""
+    if date == "today":
+        date = datetime.utcnow().strftime("%Y-%m-%d")
+    with digest_lock:
+        if date not in digest_days:
+            raise HTTPException(status_code=404, detail=f"No digest counters for {date}")
+        counters = dict(digest_days[date])
+        reconciled_at = digest_reconciled.get(date)
+    proofs = counters.get("proofs", 0)
+    return {
+        "date": date,
+        "new_sprints_today": counters.get("new_sprints", 0),
+        "proofs_submitted_today": proofs,
+        "proofs_verified_today": counters.get("proofs_passed", 0),
+        "proofs_failed_today": counters.get("proofs_failed", 0),
+        "proofs_pending_today": proofs - counters.get("proofs_passed", 0) - counters.get("proofs_failed", 0),
+        "heartbeats_today": counters.get("heartbeats", 0),
+        "average_cpu": round(counters["cpu_sum"] / counters["cpu_count"], 2) if counters.get("cpu_count") else 0,
+        "average_ram": round(counters["ram_sum"] / counters["ram_count"], 2) if counters.get("ram_count") else 0,
+        "last_ping_time": counters.get("last_ping", ""),
+        "reconciled_at": reconciled_at
+    }
+
+# Scheduled jobs
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+SCHEDULER_TIMEZONE = ZoneInfo(os.getenv("SCHEDULER_TIMEZONE", "UTC"))
+DIGEST_CRON = os.getenv("DIGEST_CRON", "0 6 * * *")
+CACHE_WARMUP_CRON = os.getenv("CACHE_WARMUP_CRON", "*/5 * * * *")
+SNAPSHOT_CRON = os.getenv("SNAPSHOT_CRON", "*/5 * * * *")
+
+# name -> job definition, state and run-time metrics
+scheduled_jobs = {}
+scheduler_tasks = []
+manual_job_tasks = set()  # keeps manually triggered runs referenced until they finish
+# Last run times restored from the snapshot, used to catch up missed runs
+job_last_runs = {}
+
+def require_admin(request: Request):
+    """Reject the request unless it carries the configured X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN")
+    if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(int, part.split("-"))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expression):
+    """Parse a five-field cron expression: minute hour day-of-month month day-of-week"""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression '{expression}' must have 5 fields")
+    minute, hour, day, month, weekday = fields
+    weekdays = parse_cron_field(weekday, 0, 7)
+    return {
+        "minute": parse_cron_field(minute, 0, 59),
+        "hour": parse_cron_field(hour, 0, 23),
+        "day": parse_cron_field(day, 1, 31),
+        "month": parse_cron_field(month, 1, 12),
+        "weekday": {d % 7 for d in weekdays},  # 0 and 7 are both Sunday
+        "hour_any": hour == "*",
+        "day_any": day == "*",
+        "weekday_any": weekday == "*"
+    }
+
+def cron_matches_day(cron, moment):
+    day_ok = moment.day in cron["day"]
+    weekday_ok = (moment.weekday() + 1) % 7 in cron["weekday"]
+    # Standard cron: if both day fields are restricted, either may match
+    if cron["day_any"] or cron["weekday_any"]:
+        return day_ok and weekday_ok
+    return day_ok or weekday_ok
+
+def local_instant(wall, tz, fold=0):
+    """Aware time for a local wall-clock time; times skipped by a DST change move to the end of the gap"""
     while True:
-        now = datetime.now()
-        # Run at 6:00 AM
-        target_time = now.replace(hour=6, minute=0, second=0, microsecond=0)
-        
-        # If it's past 6 AM today, schedule for tomorrow
-        if now.time() > dt_time(6, 0):
-            target_time = target_time.replace(day=target_time.day + 1)
-        
-        # Calculate seconds until target time
-        sleep_seconds = (target_time - now).total_seconds()
-        
-        print(f"📅 Next daily digest scheduled for: {target_time}")
-        time.sleep(sleep_seconds)
-        
-        # Generate daily digest
-        try:
-            print("🕕 Running scheduled daily digest...")
-            generate_daily_digest()
-        except Exception as e:
-            print(f"❌ Scheduled digest error: {str(e)}")
-        
-        # Sleep for 1 hour to avoid running multiple times
-        time.sleep(3600)
+        moment = wall.replace(tzinfo=tz, fold=fold)
+        if datetime.fromtimestamp(moment.timestamp(), tz).replace(tzinfo=None) == wall:
+            return moment
+        wall += timedelta(minutes=1)
+
+def next_cron_time(cron, after):
+    """First time strictly after `after` (timezone-aware) that matches the cron spec.
+
+    The spec is matched against wall-clock time in after's timezone. A time repeated when clocks go back
+    runs once, or in both passes for jobs with an hour of '*'; a time skipped when clocks go forward runs
+    when the gap ends.
+    """
+    tz = after.tzinfo
+    after_ts = after.timestamp()
+    # Wall-clock order and real order differ around DST changes, so scan from two hours back and keep
+    # scanning for two hours past the first match, taking the earliest real time
+    window = timedelta(hours=2)
+    moment = after.replace(tzinfo=None, second=0, microsecond=0) - window
+    limit = moment + timedelta(days=366 * 4)
+    best = best_wall = None
+    while moment < limit:
+        if best is not None and moment > best_wall + window:
+            return best
+        if moment.month not in cron["month"]:
+            moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+        elif not cron_matches_day(cron, moment):
+            moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+        elif moment.hour not in cron["hour"]:
+            moment = moment.replace(minute=0) + timedelta(hours=1)
+        elif moment.minute not in cron["minute"]:
+            moment += timedelta(minutes=1)
+        else:
+            for fold in ((0, 1) if cron["hour_any"] else (0,)):
+                candidate = local_instant(moment, tz, fold)
+                if candidate.timestamp() > after_ts and (best is None or candidate.timestamp() < best.timestamp()):
+                    best = candidate
+                    best_wall = best_wall or moment
+            moment += timedelta(minutes=1)
+    if best is not None:
+        return best
+    raise ValueError("Cron expression never matches")
+
+def register_job(name, cron, func, jitter_seconds=0, catch_up=False):
+    """Register a job (sync function or coroutine function) to run on a cron schedule"""
+    scheduled_jobs[name] = {
+        "name": name,
+        "cron_expression": cron,
+        "cron": parse_cron(cron),
+        "func": func,
+        "jitter_seconds": jitter_seconds,
+        "catch_up": catch_up,
+        "running": False,
+        "next_run": None,
+        "last_run": None,
+        "metrics": {"runs": 0, "failures": 0, "skipped": 0, "last_duration_seconds": None,
+                    "total_duration_seconds": 0.0, "max_duration_seconds": 0.0, "last_error": None}
+    }
+
+async def run_job(name, trigger="schedule"):
+    """Run a job once unless it is already running; returns False when skipped"""
+    job = scheduled_jobs[name]
+    metrics = job["metrics"]
+    if job["running"]:
+        metrics["skipped"] += 1
+        print(f"⏭️ Job {name} still running, skipping {trigger} run")
+        return False
+
+    job["running"] = True
+    started = time.perf_counter()
+    print(f"🕕 Running job {name} ({trigger})...")
+    try:
+        if asyncio.iscoroutinefunction(job["func"]):
+            await job["func"]()
+        else:
+            await asyncio.to_thread(job["func"])
+        metrics["last_error"] = None
+    except Exception as e:
+        metrics["failures"] += 1
+        metrics["last_error"] = str(e)
+        print(f"❌ Job {name} error: {str(e)}")
+    finally:
+        duration = time.perf_counter() - started
+        metrics["runs"] += 1
+        metrics["last_duration_seconds"] = round(duration, 3)
+        metrics["total_duration_seconds"] += duration
+        metrics["max_duration_seconds"] = round(max(metrics["max_duration_seconds"], duration), 3)
+        job["last_run"] = datetime.now(SCHEDULER_TIMEZONE)
+        job_last_runs[name] = job["last_run"].isoformat()
+        job["running"] = False
+    return True
+
+async def job_loop(job):
+    last_run = job_last_runs.get(job["name"])
+    if job["catch_up"] and last_run:
+        missed = next_cron_time(job["cron"], datetime.fromisoformat(last_run).astimezone(SCHEDULER_TIMEZONE))
+        if missed.timestamp() <= time.time():
+            print(f"⏪ Catching up missed {job['name']} run from {missed}")
+            await run_job(job["name"], trigger="catch-up")
+
+    while True:
+        # Delays come from timestamps: subtracting aware datetimes in one zone ignores DST changes
+        after = datetime.now(SCHEDULER_TIMEZONE)
+        if job["next_run"] and job["next_run"].timestamp() > after.timestamp():
+            after = job["next_run"]  # woke up early, don't run the same slot twice
+        job["next_run"] = next_cron_time(job["cron"], after)
+        delay = job["next_run"].timestamp() - time.time() + random.uniform(0, job["jitter_seconds"])
+        await asyncio.sleep(max(0.0, delay))
+        await run_job(job["name"])
+
+def start_scheduler():
+    for job in scheduled_jobs.values():
+        scheduler_tasks.append(asyncio.create_task(job_loop(job)))
+    for job in scheduled_jobs.values():
+        print(f"📅 Job {job['name']} scheduled with '{job['cron_expression']}' ({SCHEDULER_TIMEZONE})")
+
+async def stop_scheduler():
+    for task in scheduler_tasks:
+        task.cancel()
+    await asyncio.gather(*scheduler_tasks, return_exceptions=True)
+    scheduler_tasks.clear()
+
+def warm_cache():
+    """Refresh cached tables that are older than the cache TTL, one at a time"""
+    for table in list(table_cache):
+        entry = table_cache.get(table)
+        if entry and (entry["stale"] or time.time() - entry["fetched_at"] > CACHE_TTL_SECONDS):
+            if not get_breaker(table).is_open():
+                fetch_table(table)
+
+snapshot_sections["scheduler"] = (lambda: dict(job_last_runs), job_last_runs.update, False)
+
+def daily_digest_job():
+    """generate_daily_digest reports errors in its result; as a job they must fail the run"""
+    result = generate_daily_digest()
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+register_job("daily_digest", DIGEST_CRON, daily_digest_job, catch_up=True)
+register_job("cache_warmup", CACHE_WARMUP_CRON, warm_cache, jitter_seconds=30)
+register_job("snapshot", SNAPSHOT_CRON, save_snapshot, jitter_seconds=10)
+register_job("heartbeat_compaction", HEARTBEAT_COMPACTION_CRON, compact_heartbeats, jitter_seconds=60)
+register_job("digest_reconcile", DIGEST_RECONCILE_CRON, reconcile_digest_counters, jitter_seconds=30,
+             catch_up=True)
+
+@app.get("/admin/jobs")
+def list_jobs(request: Request):
+    """Scheduled jobs with their next run and run-time metrics"""
+    require_admin(request)
+    jobs = {}
+    for name, job in scheduled_jobs.items():
+        metrics = dict(job["metrics"])
+        total_duration = metrics.pop("total_duration_seconds")
+        metrics["avg_duration_seconds"] = round(total_duration / metrics["runs"], 3) if metrics["runs"] else None
+        jobs[name] = {
+            "cron": job["cron_expression"],
+            "running": job["running"],
+            "next_run": job["next_run"].isoformat() if job["next_run"] else None,
+            "last_run": job["last_run"].isoformat() if job["last_run"] else None,
+            "metrics": metrics
+        }
+    return jobs
+
+@app.post("/admin/jobs/{name}/run")
+async def trigger_job(name: str, request: Request):
+    """Run a scheduled job now, in the background"""
+    require_admin(request)
+    if name not in scheduled_jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {name}")
+    if scheduled_jobs[name]["running"]:
+        raise HTTPException(status_code=409, detail=f"Job {name} is already running")
+    task = asyncio.create_task(run_job(name, trigger="manual"))
+    manual_job_tasks.add(task)
+    task.add_done_callback(manual_job_tasks.discard)
+    return {"status": "started", "job": name}
 
 if __name__ == "__main__":
     import uvicorn
     
-    # Start daily digest scheduler in background
-    scheduler_thread = threading.Thread(target=daily_digest_scheduler, daemon=True)
-    scheduler_thread.start()
-    
-    print("🚀 Starting server with automatic daily digest scheduler...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    print("🚀 Starting server with scheduled jobs...")
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -4,40 +4,243 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 import random
+import argparse
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib3.exceptions import ConnectTimeoutError
 
 load_dotenv()
 
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 BASE_ID = os.getenv("BASE_ID")
-BASE_URL = f"https://api.airtable.com/v0/{BASE_ID}"
 
-headers = {
-    "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-    "Content-Type": "application/json"
-}
+# Same base and shard settings as the server: AIRTABLE_BASES / AIRTABLE_API_KEYS / SHARDED_TABLES
+BASE_IDS = [b.strip() for b in os.getenv("AIRTABLE_BASES", "").split(",") if b.strip()] or [BASE_ID]
+API_KEYS = [k.strip() for k in os.getenv("AIRTABLE_API_KEYS", "").split(",")]
+SHARDED_TABLES = dict(entry.split(":", 1) for entry in os.getenv("SHARDED_TABLES", "Heartbeats:Cell_ID").split(",")
+                      if ":" in entry)
 
-def delete_all_records():
-    print("🗑️ Emptying all tables...\n")
-    
-    tables = ["Sprints", "Cells", "Proof", "Heartbeats"]
-    
-    for table in tables:
+TABLES = ["Sprints", "Cells", "Proof", "Heartbeats"]
+RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))  # Airtable allows 5 requests/s per base
+WORKERS = int(os.getenv("SEED_WORKERS", "8"))
+MAX_RETRIES = 5
+
+session = requests.Session()
+
+class RateLimiter:
+    """Token bucket shared by every worker thread"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Drain the bucket so every worker backs off (after a 429)"""
+        with self.lock:
+            self.tokens = -seconds * self.rate
+
+class Progress:
+    """Per-table counters with periodic throughput reports"""
+
+    def __init__(self, action, totals):
+        self.action = action
+        self.totals = totals
+        self.done = {table: 0 for table in totals}
+        self.requests = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.lock = threading.Lock()
+
+    def add(self, table, count):
+        with self.lock:
+            self.done[table] += count
+            self.requests += 1
+            if time.monotonic() - self.last_report >= 2:
+                self.last_report = time.monotonic()
+                self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        parts = [f"{table} {self.done[table]}/{self.totals[table]}" for table in self.totals]
+        total = sum(self.done.values())
+        prefix = "✅" if final else "📈"
+        print(f"{prefix} {self.action}: {', '.join(parts)} | {total / elapsed:.1f} rec/s, "
+              f"{self.requests / elapsed:.1f} req/s, {elapsed:.0f}s")
+
+class Base:
+    """One Airtable base with its own token and rate limit"""
+
+    def __init__(self, base_id, api_key, rate=RATE_LIMIT):
+        self.base_id = base_id
+        self.url = f"https://api.airtable.com/v0/{base_id}"
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self.limiter = RateLimiter(rate)
+
+def configured_bases(rate=RATE_LIMIT):
+    return [Base(base_id, API_KEYS[i] if i < len(API_KEYS) and API_KEYS[i] else AIRTABLE_API_KEY, rate)
+            for i, base_id in enumerate(BASE_IDS)]
+
+bases = configured_bases()
+
+def table_shards(table):
+    """Bases holding a table's records: all of them for sharded tables, the first otherwise"""
+    return range(len(bases)) if table in SHARDED_TABLES else range(1)
+
+def shard_for_fields(table, fields):
+    """Base a new record belongs in, by the same rule as the server"""
+    if table not in SHARDED_TABLES:
+        return 0
+    strategy = SHARDED_TABLES[table]
+    if strategy in ("day", "month"):
+        now = datetime.utcnow()
+        return (now.toordinal() if strategy == "day" else now.year * 12 + now.month) % len(bases)
+    return int(hashlib.md5(str(fields.get(strategy, "")).encode()).hexdigest(), 16) % len(bases)
+
+def never_sent(error):
+    """The connection was never made, so Airtable can't have acted on the request"""
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, ConnectTimeoutError)
+
+def airtable(method, table, shard=0, **kwargs):
+    """Rate-limited Airtable request to one base, with retries on 429 and 5xx.
+
+    A POST is only resent when Airtable can't have received it (429 or a connect error), so a batch is never
+    created twice. response.retried is set when an earlier attempt may have gone through.
+    """
+    base = bases[shard]
+    retried = False
+    for attempt in range(MAX_RETRIES):
+        base.limiter.acquire()
         try:
-            response = requests.get(f"{BASE_URL}/{table}", headers=headers)
-            if response.status_code == 200:
-                records = response.json().get('records', [])
-                record_ids = [record['id'] for record in records]
-                
-                # Delete in batches of 10
-                for i in range(0, len(record_ids), 10):
-                    batch = record_ids[i:i+10]
-                    delete_url = f"{BASE_URL}/{table}?" + "&".join([f"records[]={rid}" for rid in batch])
-                    delete_response = requests.delete(delete_url, headers=headers)
-                    
-                print(f"🗑️ Deleted {len(record_ids)} records from {table}")
-            
-        except Exception as e:
-            print(f"❌ Error deleting from {table}: {str(e)}")
+            response = session.request(method, f"{base.url}/{table}", headers=base.headers, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            if method == "POST" and not never_sent(e):
+                raise RuntimeError(f"{type(e).__name__}, not retried as the records may have been created")
+            print(f"⚠️ {table}: {type(e).__name__}, retrying")
+            retried = True
+            time.sleep(2 ** attempt)
+            continue
+        if response.status_code == 429:
+            # Airtable blocks the base for 30 seconds after a 429
+            print(f"⏳ {table}@{base.base_id}: rate limited, pausing 30s")
+            base.limiter.pause(30)
+            continue
+        if response.status_code >= 500 and method != "POST":
+            retried = True
+            time.sleep(2 ** attempt)
+            continue
+        response.retried = retried
+        return response
+    raise RuntimeError(f"{method} {table} failed after {MAX_RETRIES} attempts")
+
+def list_record_ids(table, shard=0):
+    """Every record id in a table of one base, following the offset cursor"""
+    record_ids = []
+    offset = None
+    while True:
+        params = {"pageSize": 100}
+        if offset:
+            params["offset"] = offset
+        response = airtable("GET", table, shard, params=params)
+        if response.status_code != 200:
+            raise RuntimeError(f"List {table} failed: {response.status_code} {response.text}")
+        data = response.json()
+        record_ids += [record["id"] for record in data.get("records", [])]
+        offset = data.get("offset")
+        if not offset:
+            return record_ids
+
+def interleave(batches_by_table):
+    """Round-robin batches across tables so every table progresses at once"""
+    queues = {table: list(batches) for table, batches in batches_by_table.items()}
+    while any(queues.values()):
+        for table in list(queues):
+            if queues[table]:
+                yield table, queues[table].pop(0)
+
+def run_batches(action, batches_by_table, send_batch, workers=WORKERS):
+    """Send (base index, 10-record batch) pairs for all tables concurrently under each base's rate limit"""
+    totals = {table: sum(len(batch) for _, batch in batches) for table, batches in batches_by_table.items()}
+    progress = Progress(action, totals)
+    errors = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(send_batch, table, shard, batch): (table, batch)
+                   for table, (shard, batch) in interleave(batches_by_table)}
+        for future in as_completed(futures):
+            table, batch = futures[future]
+            try:
+                future.result()
+                progress.add(table, len(batch))
+            except Exception as e:
+                errors += 1
+                print(f"❌ {action} {table}: {str(e)}")
+    progress.report(final=True)
+    return errors
+
+def split(items, size=10):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def shard_batches(items_by_shard):
+    """10-record batches for each base, as (base index, batch) pairs"""
+    return [(shard, batch) for shard, items in items_by_shard.items() for batch in split(items)]
+
+def delete_batch(table, shard, batch):
+    response = airtable("DELETE", table, shard, params=[("records[]", rid) for rid in batch])
+    if response.status_code == 404 and response.retried:
+        return  # an earlier attempt deleted the batch before its response was lost
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code} {response.text}")
+
+def create_batch(table, shard, batch):
+    response = airtable("POST", table, shard,
+                        json={"records": [{"fields": fields} for fields in batch], "typecast": True})
+    if response.status_code not in [200, 201]:
+        raise RuntimeError(f"{response.status_code} {response.text}")
+
+def create_records(records_by_table, workers=WORKERS):
+    """Create records (lists of fields per table) in parallel 10-record batches, each in the base it shards to"""
+    batches_by_table = {}
+    for table, records in records_by_table.items():
+        by_shard = {}
+        for fields in records:
+            by_shard.setdefault(shard_for_fields(table, fields), []).append(fields)
+        batches_by_table[table] = shard_batches(by_shard)
+    return run_batches("Created", batches_by_table, create_batch, workers)
+
+def delete_all_records(tables=TABLES, workers=WORKERS):
+    print("🗑️ Emptying all tables...\n")
+
+    record_ids = {}  # table -> base index -> ids
+    with ThreadPoolExecutor(max_workers=len(tables) * len(bases)) as pool:
+        listings = {pool.submit(list_record_ids, table, shard): (table, shard)
+                    for table in tables for shard in table_shards(table)}
+        for future in as_completed(listings):
+            table, shard = listings[future]
+            try:
+                record_ids.setdefault(table, {})[shard] = future.result()
+                print(f"📋 {table}@{bases[shard].base_id}: {len(record_ids[table][shard])} records to delete")
+            except Exception as e:
+                print(f"❌ Error listing {table}@{bases[shard].base_id}: {str(e)}")
+
+    return run_batches("Deleted", {table: shard_batches(ids) for table, ids in record_ids.items()},
+                       delete_batch, workers)
 
 def add_demo_data():
     print("\n📝 Adding 10 demo records to each table...\n")
@@ -106,35 +309,89 @@ def add_demo_data():
             }
         })
     
-    # Add records to tables (in batches of 10)
-    tables_data = {
-        "Sprints": {"records": sprint_records},
-        "Cells": {"records": cell_records},
-        "Proof": {"records": proof_records},
-        "Heartbeats": {"records": heartbeat_records}
+    # Add records to all tables concurrently (in batches of 10)
+    return create_records({
+        "Sprints": [record["fields"] for record in sprint_records],
+        "Cells": [record["fields"] for record in cell_records],
+        "Proof": [record["fields"] for record in proof_records],
+        "Heartbeats": [record["fields"] for record in heartbeat_records]
+    })
+
+def synthetic_records(sprints, cells, proofs, heartbeats):
+    """Generate a synthetic dataset of the given size for load testing"""
+    run_id = random.randint(1000, 9999)
+    cell_ids = [f"CL-LOAD-{run_id}-{i:06d}" for i in range(max(cells, 1))]
+    sprint_ids = [f"SP-LOAD-{run_id}-{i:06d}" for i in range(max(sprints, 1))]
+    return {
+        "Sprints": [{
+            "Sprint_ID": sprint_ids[i],
+            "Name": f"Load test sprint {i}",
+            "Dev_Name": f"Load Bot {i % 50}",
+            "Status": random.choice(["Pending", "Active", "Done"]),
+            "Time_Spent_hr": random.randint(1, 8),
+            "Notes": "Synthetic load-test record"
+        } for i in range(sprints)],
+        "Cells": [{
+            "Cell_ID": cell_ids[i],
+            "Role": random.choice(["Builder", "Verifier", "Connector"]),
+            "IP_Address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "Health_Status": random.choice(["OK", "OK", "OK", "Warning", "Offline"]),
+            "Cost_per_hr": round(random.uniform(0.005, 0.025), 3)
+        } for i in range(cells)],
+        "Proof": [{
+            "Proof_ID": f"PR-LOAD-{run_id}-{i:06d}",
+            "Sprint_ID": random.choice(sprint_ids),
+            "Result": random.choice(["All tests passed", "Checks failed", "Pending review"]),
+            "Token": f"load_token_{random.randint(100000, 999999)}",
+            "Timestamp": (datetime.now() - timedelta(days=random.randint(0, 30))).strftime("%Y-%m-%d")
+        } for i in range(proofs)],
+        "Heartbeats": [{
+            "Cell_ID": random.choice(cell_ids),
+            "CPU_Usage": random.randint(5, 99),
+            "RAM_Usage": random.randint(10, 95),
+            "Status": random.choice(["Healthy", "Warning", "High Load"])
+        } for _ in range(heartbeats)]
     }
-    
-    for table_name, data in tables_data.items():
-        try:
-            response = requests.post(f"{BASE_URL}/{table_name}", headers=headers, json=data)
-            
-            if response.status_code in [200, 201]:
-                print(f"✅ {table_name}: Added 10 demo records")
-            else:
-                print(f"❌ {table_name}: Error {response.status_code}")
-                print(f"   Response: {response.text}")
-                
-        except Exception as e:
-            print(f"❌ {table_name}: Exception - {str(e)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reset and seed the Airtable base")
+    parser.add_argument("command", nargs="?", default="demo", choices=["demo", "reset", "seed"],
+                        help="demo: reset + 10 demo records per table (default); reset: delete everything; "
+                             "seed: add a synthetic dataset")
+    parser.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, help="Tables to reset")
+    parser.add_argument("--sprints", type=int, default=100, help="Synthetic sprints to create")
+    parser.add_argument("--cells", type=int, default=50, help="Synthetic cells to create")
+    parser.add_argument("--proofs", type=int, default=200, help="Synthetic proof records to create")
+    parser.add_argument("--heartbeats", type=int, default=1000, help="Synthetic heartbeats to create")
+    parser.add_argument("--reset", action="store_true", help="Empty the tables before seeding")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent requests")
+    parser.add_argument("--rate", type=float, default=RATE_LIMIT, help="Requests per second per base")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    print("🎯 SETTING UP DEMO DATABASE")
-    print("=" * 50)
-    
-    delete_all_records()
-    add_demo_data()
-    
-    print("\n🎉 Demo database ready!")
-    print("📊 Each table now has 10 professional demo records")
-    print("✅ Perfect for client presentation!")
-    print("\n🧪 Run 'python full_verification.py' to test everything")
\ No newline at end of file
+    args = parse_args()
+    bases = configured_bases(args.rate)
+
+    if args.command == "reset":
+        print("🎯 RESETTING DATABASE")
+        print("=" * 50)
+        delete_all_records(args.tables, args.workers)
+    elif args.command == "seed":
+        print("🎯 SEEDING SYNTHETIC DATASET")
+        print("=" * 50)
+        if args.reset:
+            delete_all_records(args.tables, args.workers)
+        records = synthetic_records(args.sprints, args.cells, args.proofs, args.heartbeats)
+        print(f"\n📝 Creating {sum(len(r) for r in records.values())} synthetic records...\n")
+        create_records(records, args.workers)
+    else:
+        print("🎯 SETTING UP DEMO DATABASE")
+        print("=" * 50)
+
+        delete_all_records(args.tables, args.workers)
+        add_demo_data()
+
+        print("\n🎉 Demo database ready!")
+        print("📊 Each table now has 10 professional demo records")
+        print("✅ Perfect for client presentation!")
+        print("\n🧪 Run 'python full_verification.py' to test everything")
\ No newline at end of file
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from main import next_cron_time, parse_cron
+
+NEW_YORK = ZoneInfo("America/New_York")
+UTC = ZoneInfo("UTC")
+
+def test_parse_cron_fields():
+    cron = parse_cron("*/15 6 1-3 * 1,7")
+    assert cron["minute"] == {0, 15, 30, 45}
+    assert cron["hour"] == {6}
+    assert cron["day"] == {1, 2, 3}
+    assert cron["month"] == set(range(1, 13))
+    assert cron["weekday"] == {1, 0}  # 7 is Sunday too
+    assert not cron["day_any"] and not cron["weekday_any"]
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "5-1 * * * *"])
+def test_parse_cron_rejects_invalid(expression):
+    with pytest.raises(ValueError):
+        parse_cron(expression)
+
+def test_next_daily_run():
+    after = datetime(2026, 10, 19, 6, 0, tzinfo=UTC)
+    assert next_cron_time(parse_cron("0 6 * * *"), after) == datetime(2026, 10, 20, 6, 0, tzinfo=UTC)
+
+def test_next_run_is_strictly_after():
+    after = datetime(2026, 10, 19, 5, 59, 59, tzinfo=UTC)
+    assert next_cron_time(parse_cron("0 6 * * *"), after) == datetime(2026, 10, 19, 6, 0, tzinfo=UTC)
+
+def test_day_of_month_or_weekday():
+    # Both day fields restricted: either may match (2026-10-19 is a Monday)
+    cron = parse_cron("0 0 25 * 1")
+    after = datetime(2026, 10, 18, 12, 0, tzinfo=UTC)
+    assert next_cron_time(cron, after) == datetime(2026, 10, 19, 0, 0, tzinfo=UTC)
+    assert next_cron_time(cron, datetime(2026, 10, 19, 1, 0, tzinfo=UTC)) == datetime(2026, 10, 25, 0, 0, tzinfo=UTC)
+
+def test_month_rollover():
+    after = datetime(2026, 12, 31, 23, 30, tzinfo=UTC)
+    assert next_cron_time(parse_cron("0 0 1 * *"), after) == datetime(2027, 1, 1, 0, 0, tzinfo=UTC)
+
+def test_daily_run_across_fall_back_fires_once_at_local_time():
+    # Clocks go back on 2026-11-01; 06:00 EDT to 06:00 EST is 25 real hours
+    after = datetime(2026, 10, 31, 6, 0, tzinfo=NEW_YORK)
+    run = next_cron_time(parse_cron("0 6 * * *"), after)
+    assert (run.year, run.month, run.day, run.hour, run.minute) == (2026, 11, 1, 6, 0)
+    assert run.timestamp() - after.timestamp() == 25 * 3600
+    assert next_cron_time(parse_cron("0 6 * * *"), run).day == 2
+
+def test_daily_run_across_spring_forward():
+    after = datetime(2026, 3, 7, 6, 0, tzinfo=NEW_YORK)
+    run = next_cron_time(parse_cron("0 6 * * *"), after)
+    assert run.timestamp() - after.timestamp() == 23 * 3600
+
+def test_fixed_hour_in_repeated_hour_runs_once():
+    cron = parse_cron("30 1 * * *")
+    first = next_cron_time(cron, datetime(2026, 11, 1, 0, 0, tzinfo=NEW_YORK))
+    assert first.astimezone(timezone.utc) == datetime(2026, 11, 1, 5, 30, tzinfo=timezone.utc)  # 01:30 EDT
+    second = next_cron_time(cron, first)
+    assert (second.month, second.day) == (11, 2)
+
+def test_wildcard_hour_runs_in_both_passes_of_repeated_hour():
+    cron = parse_cron("30 * * * *")
+    first = next_cron_time(cron, datetime(2026, 11, 1, 1, 0, tzinfo=NEW_YORK))
+    second = next_cron_time(cron, first)
+    assert second.timestamp() - first.timestamp() == 3600
+    assert second.astimezone(timezone.utc) == datetime(2026, 11, 1, 6, 30, tzinfo=timezone.utc)  # 01:30 EST
+
+def test_skipped_time_runs_when_gap_ends():
+    # 02:30 does not exist on 2026-03-08 in New York; the run moves to 03:00 EDT
+    run = next_cron_time(parse_cron("30 2 * * *"), datetime(2026, 3, 8, 0, 0, tzinfo=NEW_YORK))
+    assert run.astimezone(timezone.utc) == datetime(2026, 3, 8, 7, 0, tzinfo=timezone.utc)
+    assert next_cron_time(parse_cron("30 2 * * *"), run).day == 9
+
+def test_runs_follow_real_time_across_transitions():
+    cron = parse_cron("*/20 * * * *")
+    moment = datetime(2026, 11, 1, 0, 0, tzinfo=NEW_YORK)
+    for _ in range(12):
+        following = next_cron_time(cron, moment)
+        assert following.timestamp() - moment.timestamp() == 20 * 60
+        moment = following
+    assert moment.timestamp() - datetime(2026, 11, 1, 0, 0, tzinfo=NEW_YORK).timestamp() == timedelta(hours=4).total_seconds()
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import main
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+        self.content = self.text.encode()
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+class FakeSession:
+    """Airtable PATCH that rejects the whole request when any record has an unknown field"""
+
+    def __init__(self):
+        self.batches = []
+        self.written = {}
+
+    def request(self, method, url, **kwargs):
+        records = kwargs["json"]["records"]
+        self.batches.append([record["id"] for record in records])
+        if any("Bogus" in record["fields"] for record in records):
+            return FakeResponse(422, {"error": {"type": "UNKNOWN_FIELD_NAME"}})
+        for record in records:
+            self.written.setdefault(record["id"], {}).update(record["fields"])
+        return FakeResponse(200, {"records": [dict(record) for record in records]})
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(main.bases[0], "session", fake)
+    monkeypatch.setattr(main, "WRITE_BEHIND_SECONDS", 60)
+    yield fake
+    with main.pending_lock:
+        for timer in main.flush_timers.values():
+            timer.cancel()
+        main.flush_timers.clear()
+        main.pending_updates.clear()
+
+def test_invalid_update_drops_only_its_record(session):
+    main.queue_update("Cells", "recA", {"Health_Status": "OK"})
+    main.queue_update("Cells", "recB", {"Bogus": 1})
+    main.queue_update("Cells", "recC", {"Health_Status": "Degraded"})
+    main.flush_updates("Cells")
+    assert session.written == {"recA": {"Health_Status": "OK"}, "recC": {"Health_Status": "Degraded"}}
+    assert session.batches == [["recA", "recB", "recC"], ["recA"], ["recB"], ["recC"]]
+    assert not main.pending_updates.get("Cells")
+
+def test_valid_batch_is_sent_once(session):
+    for i in range(12):
+        main.queue_update("Cells", f"rec{i}", {"Health_Status": "OK"})
+    main.flush_updates("Cells")
+    assert len(session.written) == 12
+    assert [len(batch) for batch in session.batches] == [10, 2]